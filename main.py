@@ -27,12 +27,17 @@
 
 # Attempt to import all necessary libraries
 try:
-    import os, time, sys, time # General
+    import os, time, sys, time, atexit # General
     from rich import print as rich_print # Pretty print
     from rich.traceback import install # Pretty traceback
     install() # Install traceback
+    from python.logger import log_print, set_log_level # Logging
     from python.autoclass import AutoClass # Main class
     from python.webui import WebUI # WebUI class
+    from python.progress import RichProgressBar # Progress bar
+    from python.batch import run_batch # Batch mode
+    from python.benchmark import run_benchmark # Benchmark mode
+    from python.camera import CameraService # Camera capture
 except ImportError as e:
     print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
     print("In addition, make sure you are running Python 3.8")
@@ -43,27 +48,12 @@ except ImportError as e:
 # Determine the main project directory, for compatibility (the absolute path to this file)
 maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__))) 
 
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
 # Custom low-level functions
-def print(text="", log_filename="", end="\n", max_file_mb=10):
-    global maindirectory
-    script_name = os.path.splitext(os.path.basename(__file__))[0]
-    if log_filename == "":
-        log_filename = f"{script_name}.log"
-    log_file_path = os.path.join(maindirectory, "logs", log_filename)
-    if os.path.exists(log_file_path) and os.path.getsize(log_file_path) > max_file_mb * 1024 * 1024:
-        try:
-            with open(log_file_path, "w") as f:
-                f.write("")
-        except Exception as e:
-            rich_print(f"[red][ERROR][/red]: {e}")
-            rich_print(f"[red][ERROR][/red]: Could not clear log file at {log_file_path}.")
-    try:
-        with open(log_file_path, "a") as f:
-            f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {text}\n")
-    except Exception as e:
-        rich_print(f"[red][ERROR][/red]: {e}")
-        rich_print(f"[red][ERROR][/red]: Could not write to log file at {log_file_path}.")
-    rich_print(text, end=end)
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
 
 # [ MAIN ]
 if __name__ == "__main__":
@@ -100,7 +90,7 @@ if __name__ == "__main__":
                 value = value.split("=")
                 arguments[value[0]] = value[1]
     except IndexError:
-        print(log_filename="errors.log", text="[red][ERROR][/red]: No arguments were provided. You must provide arguments in the format of `argument=value`")
+        print(log_filename="errors.log", text="[red][ERROR][/red]: No arguments were provided. You must provide arguments in the format of `argument=value`", level="error")
         print(log_filename="errors.log", text="Example: `python3 main.py input=\"FULL_PATH_TO_IMAGE.png\" output=\"FULL_PATH_TO_OUTPUT.gcode\"`")
         print(log_filename="errors.log", text="Please see the README for more info, or try `python3 main.py --help`")
         quit()
@@ -114,6 +104,28 @@ if __name__ == "__main__":
         print("[OPTIONS]")
         print("input: The input filename. If this is not provided, then the script will capture from a webcam.")
         print("output: The output filename. This is required.")
+        print("solver: The method used to order the skeleton pixels. \"grid\" (default, fast), \"trace\" (walks the skeleton into separate strokes), \"components\" (solves each separate piece of the skeleton in parallel) or \"reference\" (original, slow).")
+        print("solver_workers: The number of worker processes used by solver=components. Defaults to the number of CPU cores.")
+        print("optimize_travel: Reorder the strokes to minimize pen travel between them. Defaults to true.")
+        print("travel_time_budget: The maximum number of seconds spent optimizing pen travel. Defaults to 1.")
+        print("simplify: How to reduce the number of gcode lines. \"rdp\" (default), \"collinear\" (lossless) or \"none\".")
+        print("simplify_tolerance: How far (in mm) a simplified line may stray from the drawing. Defaults to 0.5.")
+        print("resolution: The width and height in pixels of the square canvas the image is resized to before it is thinned. Smaller is faster but less detailed. Defaults to 1000.")
+        print("mm_per_pixel: Size the canvas from the drawing area instead (the machine size minus the borders), with one pixel per this many mm, keeping the aspect ratio. Overrides resolution when above 0. Defaults to 0.")
+        print("auto_crop: Only run the distance transform and thinning on the bounding box of the drawing, skipping blank margins. Defaults to true.")
+        print("thinning: How the image is thinned into a skeleton. \"zhangsuen\" (default), \"guohall\", \"lut\" (Zhang-Suen in NumPy, no opencv-contrib-python needed) or \"ridge\" (peels the distance map layer by layer, keeping thick strokes centered).")
+        print("log_level: The minimum level of messages to log: debug, info (default), warning or error.")
+        print("batch: A directory or glob pattern (e.g. \"scans/*.png\") of images to convert in one go, in parallel.")
+        print("output_dir: Where batch mode writes one gcode file per image. Defaults to temp/batch.")
+        print("workers: The number of worker processes used in batch mode. Defaults to the number of CPU cores.")
+        print("camera_best_of: The number of recent webcam frames to pick the sharpest from when capturing. 1 takes the latest frame. Defaults to 5.")
+        print("web_workers: The number of WebUI jobs that can be solved at the same time. Defaults to 2.")
+        print("web_queue_size: The maximum number of WebUI jobs waiting or being solved before new ones are turned away. Defaults to 8.")
+        print("cache: Reuse the skeleton and solved points of images that were converted before (API and batch mode). Defaults to true.")
+        print("cache_size_mb: The maximum size of the cache in temp/cache, in megabytes. Defaults to 256.")
+        print("profile: Record the time, CPU time and memory of each stage, and write them to a JSON report next to the gcode (e.g. temp/output.profile.json). Defaults to false.")
+        print("benchmark: Time every stage on the example images and on generated stress images, and save the results to temp/benchmark. Give the path of an earlier results file instead of true to compare against it.")
+        print("benchmark_repeat: The number of times each benchmark image is converted (the median time is kept). Defaults to 3.")
         print("help: Displays this help message.")
         quit()
 
@@ -129,7 +141,7 @@ if __name__ == "__main__":
             return arg_val
         except KeyError:
             if required:
-                print(f"[red][ERROR][/red]: No {arg_key} was provided. This is a required argument. Please see `python3 main.py --help` for more info.")
+                print(f"[red][ERROR][/red]: No {arg_key} was provided. This is a required argument. Please see `python3 main.py --help` for more info.", level="error")
                 quit()
             else:
                 print(f"[gold1][INFO][/gold1]: No {arg_key} was provided. Assuming value of `{default_val}`.")
@@ -154,11 +166,50 @@ if __name__ == "__main__":
     parse_arg(opts_dict, "execute", arguments.get("execute", False))
     parse_arg(opts_dict, "webui", arguments.get("webui", True))
     parse_arg(opts_dict, "camera_bounds", str(arguments.get("camera_bounds", "(0,0)(0,0)")))
+    parse_arg(opts_dict, "camera_best_of", int(arguments.get("camera_best_of", 5)))
+    parse_arg(opts_dict, "solver", str(arguments.get("solver", "grid")))
+    parse_arg(opts_dict, "solver_workers", int(arguments.get("solver_workers", 0)))
+    parse_arg(opts_dict, "optimize_travel", arguments.get("optimize_travel", True))
+    parse_arg(opts_dict, "travel_time_budget", float(arguments.get("travel_time_budget", 1.0)))
+    parse_arg(opts_dict, "simplify", str(arguments.get("simplify", "rdp")))
+    parse_arg(opts_dict, "simplify_tolerance", float(arguments.get("simplify_tolerance", 0.5)))
+    parse_arg(opts_dict, "resolution", int(arguments.get("resolution", 1000)))
+    parse_arg(opts_dict, "mm_per_pixel", float(arguments.get("mm_per_pixel", 0.0)))
+    parse_arg(opts_dict, "auto_crop", arguments.get("auto_crop", True))
+    parse_arg(opts_dict, "thinning", str(arguments.get("thinning", "zhangsuen")))
+    parse_arg(opts_dict, "log_level", str(arguments.get("log_level", "info")))
+    parse_arg(opts_dict, "batch", arguments.get("batch", False))
+    parse_arg(opts_dict, "output_dir", str(arguments.get("output_dir", os.path.join(maindirectory, "temp", "batch"))))
+    parse_arg(opts_dict, "workers", int(arguments.get("workers", 0)))
+    parse_arg(opts_dict, "web_workers", int(arguments.get("web_workers", 2)))
+    parse_arg(opts_dict, "web_queue_size", int(arguments.get("web_queue_size", 8)))
+    parse_arg(opts_dict, "cache", arguments.get("cache", True))
+    parse_arg(opts_dict, "cache_size_mb", int(arguments.get("cache_size_mb", 256)))
+    parse_arg(opts_dict, "profile", arguments.get("profile", False))
+    parse_arg(opts_dict, "benchmark", arguments.get("benchmark", False))
+    parse_arg(opts_dict, "benchmark_repeat", int(arguments.get("benchmark_repeat", 3)))
+
+    # Apply the log level before anything else gets logged
+    try:
+        set_log_level(opts_dict["log_level"])
+    except ValueError as e:
+        print(f"[red][ERROR][/red]: {e}", level="error")
+        quit()
 
     # Display all arguments in console
     print(f"Arguments: {opts_dict}\n")
 
     # [ Run the program ]
+    # If a batch of images was given, convert them all in parallel and exit
+    if opts_dict.get("batch"):
+        print("[gold1][INFO][/gold1]: Batch mode enabled, converting images...")
+        run_batch(opts_dict, str(opts_dict["batch"]), opts_dict["output_dir"], opts_dict["workers"])
+        quit()
+    # If benchmark mode is enabled, time the pipeline on the benchmark images and exit
+    if opts_dict.get("benchmark"):
+        print("[gold1][INFO][/gold1]: Benchmark mode enabled, benchmarking the pipeline...")
+        run_benchmark(opts_dict, "" if opts_dict["benchmark"] is True else str(opts_dict["benchmark"]), opts_dict["benchmark_repeat"])
+        quit()
     # If show_webui enabled, then run the webui interface
     # Otherwise, run the program via command line and opencv interface
     if opts_dict.get("webui", False):
@@ -167,65 +218,74 @@ if __name__ == "__main__":
         webui.run()
     else:
         print("[gold1][INFO][/gold1]: WebUI disabled, running program in standalone mode...")
+        # Keep the camera open across runs (it is only opened once an image is captured)
+        camera = CameraService(opts_dict["camera_number"])
+        atexit.register(camera.stop)
         while True:
             # Create the AutoClass object
-            auto_obj = AutoClass(opts_dict)
+            auto_obj = AutoClass(opts_dict, camera=camera)
+            # Show the progress of long-running stages as a progress bar
+            auto_obj.progress.add_callback(RichProgressBar())
             try:
                 # Run routine to capture, convert, and create gcode
                 # Make sure that an output filename is configured
                 if not auto_obj.is_output_configured():
-                    print("[red][ERROR][/red]: No output filename was provided. Please see `python3 main.py --help` for more info.")
+                    print("[red][ERROR][/red]: No output filename was provided. Please see `python3 main.py --help` for more info.", level="error")
                     quit()
                 # Check if there is an image already ready from input
                 if not auto_obj.is_image_ready():
                     # If not, then capture an image
                     auto_obj.get_image()
-                # Import the image
-                auto_obj.import_image()
-                # Show the initial image
-                auto_obj.display_image(window_name="Initial Image")
-                # Rotate the image 180 degrees (we mounted camera upside down)
-                auto_obj.rotate_image()
-                # Display the image progress
-                auto_obj.display_image(window_name="Flipped Image")
-                # Crop the image based on camera bounds
-                auto_obj.crop_image()
-                # Display the image progress
-                auto_obj.display_image(window_name="Cropped Image")
-                # Convert the image to grayscale
-                auto_obj.grayscale_image()
-                # Display the image progress
-                auto_obj.display_image(window_name="Grayscale Image")
-                # Invert the image
-                auto_obj.invert_image()
-                # Display the image progress
-                auto_obj.display_image(window_name="Inverted Image")
-                # Threshold the image
-                auto_obj.threshold_image()
-                # Display the image progress
-                auto_obj.display_image(window_name="Thresholded Image")
-                # Convert the image to a fixed size
-                auto_obj.resize_image_fixed(width=1000, height=1000)
-                # Display the image progress
-                auto_obj.display_image(window_name="Resized Image")
-                # Apply Euclidean distance transform
-                distance_map = auto_obj.get_distance_map()
-                # Display the image progress
-                auto_obj.display_image(image=distance_map, window_name="Distance Transform")
-                # Normalize distance map
-                auto_obj.normalize_distance_map()
-                # Display the image progress
-                auto_obj.display_image(window_name="Normalized Distance Transform")
-                # Use thinning method to get skeleton of the image
-                skel = auto_obj.get_skeleton()
-                # Display the image progress
-                auto_obj.display_image(image=skel, window_name="Skeleton")
-                # "Solve" the skeleton by finding adjacent points
-                solved_pixels = auto_obj.solve_pixels()
-                # Get the gcode from the solved pixels
-                gcode = auto_obj.get_gcode(solved_pixels)
-                # Write the gcode to the output file
-                auto_obj.write_gcode(gcode)
+                # Import the image and preprocess it in one fused stage, unless each step is shown
+                if not auto_obj.get_prefs("display"):
+                    auto_obj.preprocess_image()
+                else:
+                    # Import the image
+                    auto_obj.import_image()
+                    # Show the initial image
+                    auto_obj.display_image(window_name="Initial Image")
+                    # Rotate the image 180 degrees (we mounted camera upside down)
+                    auto_obj.rotate_image()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Flipped Image")
+                    # Crop the image based on camera bounds
+                    auto_obj.crop_image()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Cropped Image")
+                    # Convert the image to grayscale
+                    auto_obj.grayscale_image()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Grayscale Image")
+                    # Invert the image
+                    auto_obj.invert_image()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Inverted Image")
+                    # Threshold the image
+                    auto_obj.threshold_image()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Thresholded Image")
+                    # Convert the image to a fixed size
+                    auto_obj.resize_image_fixed()
+                    # Display the image progress
+                    auto_obj.display_image(window_name="Resized Image")
+                    # The distance map is only worked out here, to be shown (the gcode doesn't need it)
+                    # Apply Euclidean distance transform
+                    distance_map = auto_obj.get_distance_map()
+                    # Display the image progress
+                    auto_obj.display_image(image=distance_map, window_name="Distance Transform")
+                    # Display the normalized distance map
+                    auto_obj.display_image(image=auto_obj.normalize_distance_map(), window_name="Normalized Distance Transform")
+                    # Use thinning method to get skeleton of the image
+                    skel = auto_obj.get_skeleton()
+                    # Display the image progress
+                    auto_obj.display_image(image=skel, window_name="Skeleton")
+                # Thin, solve (or trace), order and simplify the image into strokes, running only the stages that haven't run yet
+                solved_pixels = auto_obj.get_strokes()
+                # Stream the gcode for the solved pixels straight into the output file
+                auto_obj.write_gcode(auto_obj.iter_gcode(solved_pixels))
+                # If profiling is enabled, write the time and memory each stage took to a JSON report
+                if auto_obj.get_prefs("profile"):
+                    auto_obj.write_profile()
                 # If get_prefs("execute") is enabled, then we print the gcode using Pronterface
                 # NOTE: PRONTERFACE ONLY WORKS ON WINDOWS
                 if auto_obj.get_prefs("execute"):
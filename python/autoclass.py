@@ -3,12 +3,25 @@
 
 # Attempt to import all necessary libraries
 try:
-    import os, time, sys, time, math, platform # General
+    import os, time, sys, time, platform # General
     import cv2 # OpenCV
     import numpy as np # Numpy
     from rich import print as rich_print # Pretty print
     from rich.traceback import install # Pretty traceback
     install() # Install traceback
+    from python.logger import log_print # Logging
+    from python import pipeline # Image -> gcode conversion stages
+    from python.pipeline import PipelineError # Conversion errors
+    from python.solver import SOLVERS, extract_white_pixels # Path solvers
+    from python.tracer import trace_skeleton, is_stroke_list # Skeleton tracer
+    from python.ordering import order_strokes, split_strokes # Stroke ordering
+    from python.simplify import SIMPLIFY_METHODS, simplify_strokes # Stroke simplification
+    from python.gcode import iter_gcode, write_gcode # Gcode writer
+    from python.progress import ProgressReporter # Progress reporting
+    from python.camera import CameraService, CameraError # Camera capture
+    from python.profiler import StageProfiler, profiled, report_table, save_report # Stage profiling
+    from python.thinning import HAS_XIMGPROC # Thinning backends
+    from python.stages import StageGraph # Lazy pipeline stages
 except ImportError as e:
     print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
     print("In addition, make sure you are running Python 3.8")
@@ -20,31 +33,36 @@ except ImportError as e:
 # Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
 maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..") 
 
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
 # Custom low-level functions
-def print(text="", log_filename="", end="\n", max_file_mb=10):
-    global maindirectory
-    script_name = os.path.splitext(os.path.basename(__file__))[0]
-    if log_filename == "":
-        log_filename = f"{script_name}.log"
-    log_file_path = os.path.join(maindirectory, "logs", log_filename)
-    if os.path.exists(log_file_path) and os.path.getsize(log_file_path) > max_file_mb * 1024 * 1024:
-        try:
-            with open(log_file_path, "w") as f:
-                f.write("")
-        except Exception as e:
-            rich_print(f"[red][ERROR][/red]: {e}")
-            rich_print(f"[red][ERROR][/red]: Could not clear log file at {log_file_path}.")
-    try:
-        with open(log_file_path, "a") as f:
-            f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {text}\n")
-    except Exception as e:
-        rich_print(f"[red][ERROR][/red]: {e}")
-        rich_print(f"[red][ERROR][/red]: Could not clear log file at {log_file_path}.")
-    rich_print(text, end=end)
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
+
+# Options that can be changed after the image is prepared (see update_options), and the attribute each one is kept in
+# The options that decide the working canvas (resolution, mm_per_pixel) and how the image is prepared can't be changed
+TUNABLE_OPTIONS = {
+    "maximum_x": "program_maximum_x",
+    "maximum_y": "program_maximum_y",
+    "border_x": "program_border_x",
+    "border_y": "program_border_y",
+    "initial_speed": "program_initial_speed",
+    "acceleration": "program_initial_acceleration",
+    "dwell_time": "program_dwell_time",
+    "debug": "program_debug",
+    "thinning": "program_thinning",
+    "solver": "program_solver",
+    "solver_workers": "program_solver_workers",
+    "optimize_travel": "program_optimize_travel",
+    "travel_time_budget": "program_travel_time_budget",
+    "simplify": "program_simplify",
+    "simplify_tolerance": "program_simplify_tolerance",
+}
 
 # Define the class itself
 class AutoClass:
-    def __init__(self, opts_dict):
+    def __init__(self, opts_dict, camera=None):
         # Hello message
         print("[purple4][AUTOCLASS][/purple4] Initializing AutoClass...")
         
@@ -54,7 +72,7 @@ class AutoClass:
         # If any values are not set in the opts_dict, raise an error
         for key, value in opts_dict.items():
             if value == "":
-                print(f"[red][ERROR][/red] The value for {key} is not set. Please set it when instantiating the AutoClass class.")
+                print(f"[red][ERROR][/red] The value for {key} is not set. Please set it when instantiating the AutoClass class.", level="error")
                 quit()
 
         # Set program arguments
@@ -75,10 +93,50 @@ class AutoClass:
         self.print_flag = bool(self.opts_dict['execute'])
         self.show_webui = bool(self.opts_dict['webui'])
         self.program_camera_bounds = str(self.opts_dict['camera_bounds'])
+        self.program_solver = str(self.opts_dict.get('solver', "grid"))
+        self.program_solver_workers = int(self.opts_dict.get('solver_workers', 0))
+        self.program_optimize_travel = bool(self.opts_dict.get('optimize_travel', True))
+        self.program_travel_time_budget = float(self.opts_dict.get('travel_time_budget', 1.0))
+        self.program_simplify = str(self.opts_dict.get('simplify', "rdp"))
+        self.program_simplify_tolerance = float(self.opts_dict.get('simplify_tolerance', 0.5))
+        self.program_camera_best_of = int(self.opts_dict.get('camera_best_of', 5))
+        self.program_profile = bool(self.opts_dict.get('profile', False))
+        self.program_resolution = int(self.opts_dict.get('resolution', 1000))
+        self.program_mm_per_pixel = float(self.opts_dict.get('mm_per_pixel', 0.0))
+        self.program_auto_crop = bool(self.opts_dict.get('auto_crop', True))
+        self.program_thinning = str(self.opts_dict.get('thinning', "zhangsuen"))
+
+        # Camera capture service, either shared by the caller (so it stays open between runs) or opened on the first capture
+        self.camera = camera
+        self.owns_camera = camera is None
+
+        # Progress of long-running stages, for the CLI progress bar and the WebUI to follow
+        self.progress = ProgressReporter()
+
+        # The stages after the image is prepared, each run only once something asks for its output (see get_strokes)
+        self.stages = StageGraph()
+        self.define_stages()
+        self.image = None
+        self.distance_map = None
+        self.skeleton = None
+
+        # Time, CPU and memory of each stage, recorded when profiling is turned on (see write_profile)
+        # The WebUI always records the timings for its metrics, but only tracks memory when profiling
+        self.profiler = StageProfiler(os.path.basename(self.program_input_filename), track_memory=self.program_profile) if self.program_profile or self.show_webui else None
 
         # Convert camera bounds to the format of "(0,0)(0,0)" to [[0,0],[0,0]]
-        temp_bounds = self.program_camera_bounds.replace(")(",",").replace("(","").replace(")","").split(",")
-        self.program_camera_bounds = [[int(temp_bounds[0]), int(temp_bounds[1])], [int(temp_bounds[2]), int(temp_bounds[3])]]
+        try:
+            self.program_camera_bounds = pipeline.parse_camera_bounds(self.program_camera_bounds)
+        except PipelineError as e:
+            print(f"[red][ERROR][/red] {e}", level="error")
+            quit()
+
+        # Get the size of the working canvas the image is resized to, as (width, height)
+        try:
+            self.program_width, self.program_height = pipeline.get_resolution(self.get_pipeline_options())
+        except PipelineError as e:
+            print(f"[red][ERROR][/red] {e}", level="error")
+            quit()
 
         # Set the full paths for input and output filenames
         self.program_input_filename = os.path.join(maindirectory, "temp", self.program_input_filename)
@@ -92,17 +150,22 @@ class AutoClass:
                 GPIO.setmode(GPIO.BCM)
                 GPIO.setup(self.input_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
             except Exception as e:
-                print(f"[red][ERROR][/red] Failed to initialize GPIO. Are you running this on a Pi? Traceback: {e}")
+                print(f"[red][ERROR][/red] Failed to initialize GPIO. Are you running this on a Pi? Traceback: {e}", level="error")
                 quit()
         
     # Cleanup function to be called when the program is exiting
     def cleanup(self):
+        if self.profiler is not None:
+            self.profiler.close()
+        if self.owns_camera and self.camera is not None:
+            self.camera.stop()
+            self.camera = None
         if self.pi_mode:
             try:
                 import RPi.GPIO as GPIO
                 GPIO.cleanup()
             except Exception as e:
-                print(f"[red][ERROR][/red] Failed to cleanup GPIO. Are you running this on a Pi? Traceback: {e}")
+                print(f"[red][ERROR][/red] Failed to cleanup GPIO. Are you running this on a Pi? Traceback: {e}", level="error")
                 quit()
     
     # Function to return contents of a variable
@@ -162,10 +225,15 @@ class AutoClass:
                 if not self.show_webui and self.program_display:
                     print("[INFO]: Press [yellow]ENTER[/yellow] to capture an image from the webcam.")
                     input()
-                # Take photo
+                # Take photo, from a camera that is kept open between shots
                 print("[purple4][AUTOCLASS][/purple4] Capturing image from webcam...")
-                cap = cv2.VideoCapture(self.camera_number)
-                frame = cap.read()[1]
+                if self.camera is None:
+                    self.camera = CameraService(self.camera_number)
+                try:
+                    frame = self.camera.best_frame(self.program_camera_best_of)
+                except CameraError as e:
+                    print(f"[red][ERROR][/red] Failed to capture an image. Traceback: {e}", level="error")
+                    quit()
                 cv2.imwrite(self.program_input_filename, frame)
                 print("[purple4][AUTOCLASS][/purple4] Image captured.")
                 # If webUI is not enabled, display the image
@@ -183,203 +251,307 @@ class AutoClass:
             return frame
         
     # Import image
+    @profiled
     def import_image(self):
         print("[purple4][AUTOCLASS][/purple4] Importing image...")
         try:
-            self.image = cv2.imread(self.program_input_filename)
+            self.set_image(cv2.imread(self.program_input_filename))
         except Exception as e:
-            print(f"[red][ERROR][/red] Failed to import image. Please check the input filename. Traceback: {e}")
+            print(f"[red][ERROR][/red] Failed to import image. Please check the input filename. Traceback: {e}", level="error")
             quit()
         print("[purple4][AUTOCLASS][/purple4] Image imported.")
     
+    # Import the image and run every step up to the resize as one fused stage, for when the steps aren't shown one by one
+    @profiled
+    def preprocess_image(self):
+        print("[purple4][AUTOCLASS][/purple4] Importing and preprocessing image...")
+        try:
+            with open(self.program_input_filename, "rb") as f:
+                self.set_image(pipeline.preprocess_image(f.read(), self.program_camera_bounds, (self.program_width, self.program_height)))
+        except (OSError, PipelineError) as e:
+            print(f"[red][ERROR][/red] Failed to import image. Please check the input filename. Traceback: {e}", level="error")
+            quit()
+        print(f"[purple4][AUTOCLASS][/purple4] Image preprocessed to \"{self.program_width}x{self.program_height}\".")
+
+    # Replace the image, throwing away every stage computed from the old one
+    def set_image(self, image):
+        self.image = image
+        self.stages.set("image", image)
+
     # Rotate image 180 degrees
+    @profiled
     def rotate_image(self):
         print("[purple4][AUTOCLASS][/purple4] Rotating image...")
-        self.image = cv2.rotate(self.image, cv2.ROTATE_180)
+        self.set_image(pipeline.rotate_image(self.image))
         print("[purple4][AUTOCLASS][/purple4] Image rotated.")
     
     # Crop image
+    @profiled
     def crop_image(self):
         print("[purple4][AUTOCLASS][/purple4] Cropping image based on camera bounds...")
         if self.program_camera_bounds != [[0, 0], [0, 0]]:
             print("[purple4][AUTOCLASS][/purple4] Camera bounds: " + str(self.program_camera_bounds))
-            self.image = self.image[self.program_camera_bounds[0][1]:self.program_camera_bounds[1][1], self.program_camera_bounds[0][0]:self.program_camera_bounds[1][0]]
+            self.set_image(pipeline.crop_image(self.image, self.program_camera_bounds))
         print("[purple4][AUTOCLASS][/purple4] Image cropped.")
 
     # Convert image to grayscale
+    @profiled
     def grayscale_image(self):
         print("[purple4][AUTOCLASS][/purple4] Converting image to grayscale...")
-        self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        self.set_image(pipeline.grayscale_image(self.image))
         print("[purple4][AUTOCLASS][/purple4] Image converted to grayscale.")
 
     # Convert image to black and white
+    @profiled
     def invert_image(self):
         print("[purple4][AUTOCLASS][/purple4] Converting image to black and white...")
-        self.image = cv2.bitwise_not(self.image)
+        self.set_image(pipeline.invert_image(self.image))
         print("[purple4][AUTOCLASS][/purple4] Image converted to black and white.")
 
     # Threshold image
+    @profiled
     def threshold_image(self):
         print("[purple4][AUTOCLASS][/purple4] Thresholding image...")
-        self.image = cv2.threshold(self.image, 127, 255, cv2.THRESH_BINARY)[1]
+        self.set_image(pipeline.threshold_image(self.image))
         print("[purple4][AUTOCLASS][/purple4] Image thresholded.")
     
-    # Convert image to fixed size
-    def resize_image_fixed(self, width=1000, height=1000):
+    # Convert image to fixed size (the working resolution, unless a size is given)
+    @profiled
+    def resize_image_fixed(self, width=None, height=None):
+        width = width or self.program_width
+        height = height or self.program_height
         print("[purple4][AUTOCLASS][/purple4] Resizing image to fixed size...")
-        self.image = cv2.resize(self.image, (width, height))
+        self.set_image(pipeline.resize_image(self.image, width, height))
         print(f"[purple4][AUTOCLASS][/purple4] Image resized to fixed size of \"{width}x{height}\"")
     
-    # Apply Euclidean Distance Transform to get distance map
+    # Get the bounding box (x, y, width, height) of the ink in the thresholded image, so the distance transform and
+    # thinning skip the blank margins, or None to work on the whole image (auto_crop off, or no ink)
+    def get_roi(self, image):
+        if not self.program_auto_crop:
+            return None
+        return pipeline.find_roi(image)
+
+    # Get the distance map of the image (Euclidean Distance Transform), working it out the first time it is asked for
     def get_distance_map(self):
-        print("[purple4][AUTOCLASS][/purple4] Getting distance map...")
-        self.distance_map = cv2.distanceTransform(self.image, cv2.DIST_L2, 5)
-        print("[purple4][AUTOCLASS][/purple4] Distance map obtained.")
+        self.distance_map = self.stages.get("distance_map")
         return self.distance_map
-    
-    # Normalize distance map
+
+    # Get the normalized distance map, for display
     def normalize_distance_map(self):
         print("[purple4][AUTOCLASS][/purple4] Normalizing distance map...")
-        cv2.normalize(self.distance_map, self.distance_map, 0, 255, cv2.NORM_MINMAX)
-        print("[purple4][AUTOCLASS][/purple4] Distance map normalized.")
-        return self.distance_map
-    
-    # Use thinning method to get skeleton of the image
+        return self.stages.get("normalized_distance_map")
+
+    # Get the skeleton of the image, thinning it the first time it is asked for
     def get_skeleton(self):
-        print("[purple4][AUTOCLASS][/purple4] Getting skeleton...")
-        self.skeleton = cv2.ximgproc.thinning(self.image, cv2.ximgproc.THINNING_ZHANGSUEN)
-        self.skeleton = self.skeleton.astype(np.uint8)
-        self.skeleton = cv2.cvtColor(self.skeleton, cv2.COLOR_GRAY2BGR)
-        print("[purple4][AUTOCLASS][/purple4] Skeleton obtained and converted back to image.")
+        self.skeleton = self.stages.get("skeleton")
         return self.skeleton
 
+    # Get the final strokes, ready to be written as gcode, running only the stages that haven't been run for this image yet
+    def get_strokes(self):
+        return self.stages.get("strokes")
+
+    # Define the stages after the image is prepared for the current options, and the options each stage depends on
+    # The distance map is only needed by the displays and the ridge thinning backend, so it is usually never computed
+    # Simplifying works in mm, so it depends on the machine size and borders too (ordering works in pixels, so it doesn't)
+    # [NOTE]: The gcode options (speed, acceleration, dwell time, debug) are read when the gcode is written, so no stage depends on them
+    def define_stages(self):
+        machine = ["maximum_x", "maximum_y", "border_x", "border_y"]
+        self.stages.add("distance_map", self.find_distance_map, ["image"])
+        self.stages.add("normalized_distance_map", pipeline.normalize_distance_map, ["distance_map"])
+        self.stages.add("skeleton", self.thin_image, ["image", "distance_map"] if self.program_thinning == "ridge" else ["image"], ["thinning"])
+        self.stages.add("solved", self.trace_skeleton if self.program_solver == "trace" else self.solve_pixels, ["skeleton"], ["solver"])
+        self.stages.add("ordered", self.order_strokes, ["solved"], ["optimize_travel", "travel_time_budget"])
+        self.stages.add("strokes", self.simplify_strokes, ["ordered"], ["simplify", "simplify_tolerance"] + machine)
+        self.stages.set_params({option: getattr(self, attribute) for option, attribute in TUNABLE_OPTIONS.items()})
+
+    # Change some of the TUNABLE_OPTIONS of a prepared image, keeping the output of every stage that doesn't depend on them
+    # (e.g. a new speed only changes the gcode, and a new simplify tolerance only simplifies the solved strokes again)
+    # Get the names of the stages that will be run again, or raise a PipelineError for an invalid or untunable change
+    def update_options(self, changes):
+        unknown = [key for key in changes if key not in TUNABLE_OPTIONS]
+        if unknown:
+            raise PipelineError(f"Option(s) {', '.join(unknown)} can't be changed once the image is prepared. Tunable options: {', '.join(TUNABLE_OPTIONS)}")
+        current = {option: getattr(self, attribute) for option, attribute in TUNABLE_OPTIONS.items()}
+        options = pipeline.resolve_options({**self.get_pipeline_options(), **current, **changes})
+        if pipeline.get_resolution(options) != (self.program_width, self.program_height):
+            raise PipelineError("These options change the size of the working canvas (see mm_per_pixel), so the image has to be prepared again")
+        for key in changes:
+            setattr(self, TUNABLE_OPTIONS[key], options[key])
+            self.opts_dict[key] = options[key]
+        # A new thinning backend or solver also changes which function (or inputs) a stage has
+        ready = self.stages.ready()
+        self.define_stages()
+        stages = ready - self.stages.ready()
+        print(f"[purple4][AUTOCLASS][/purple4] Options updated ({', '.join(f'{key}={options[key]}' for key in changes)}), stages to run again: {', '.join(sorted(stages)) or 'none'}")
+        return stages
+
+    # Apply Euclidean Distance Transform to get distance map
+    @profiled
+    def find_distance_map(self, image):
+        print("[purple4][AUTOCLASS][/purple4] Getting distance map...")
+        distance_map = pipeline.apply_in_roi(pipeline.get_distance_map, image, self.get_roi(image))
+        print("[purple4][AUTOCLASS][/purple4] Distance map obtained.")
+        return distance_map
+
+    # Use the selected thinning backend to get skeleton of the image (the ridge backend also gets the distance map)
+    @profiled
+    def thin_image(self, image, distance_map=None):
+        print(f"[purple4][AUTOCLASS][/purple4] Getting skeleton with the \"{self.program_thinning}\" thinning backend...")
+        if self.program_thinning in ("zhangsuen", "guohall") and not HAS_XIMGPROC:
+            print("[gold1][INFO][/gold1]: cv2.ximgproc is not installed (it comes with opencv-contrib-python), using the NumPy lookup table version instead.")
+        try:
+            roi = self.get_roi(image)
+            if roi is not None:
+                print(f"[purple4][AUTOCLASS][/purple4] Thinning only the drawing's bounding box ({roi[2]}x{roi[3]} at {roi[0]},{roi[1]})...")
+            extras = () if distance_map is None else (distance_map,)
+            skeleton = pipeline.apply_in_roi(lambda image, distance_map=None: pipeline.get_skeleton(image, distance_map, self.program_thinning), image, roi, *extras)
+        except PipelineError as e:
+            print(f"[red][ERROR][/red] {e}", level="error")
+            quit()
+        print("[purple4][AUTOCLASS][/purple4] Skeleton obtained.")
+        return skeleton
+
     # "Solve" pixels with my method to gather all white pixels and compare coords to build list of nearest ones
     # [NOTE]: This is *essential* to writing the gcode as otherwise it would plot random points instead of our drawn line
-    def solve_pixels(self):
+    @profiled
+    def solve_pixels(self, skeleton=None):
+        if skeleton is None:
+            skeleton = self.get_skeleton()
         print("[purple4][AUTOCLASS][/purple4] Solving pixels by computing nearest neighbors...")
         print("[hot_pink3][SOLVING][/hot_pink3] Finding coords of all white pixels...")
-        # Gather coords of all white pixels in a list
-        white_pixels = []
-        for y in range(0, 1000):
-            for x in range(0, 1000):
-                if self.skeleton[y][x][0] == 255:
-                    white_pixels.append([x, y])
-        print("[hot_pink3][SOLVING][/hot_pink3] Coords gathered.")
-        # Create a new list of solved_white_pixels
-        solved_white_pixels = []
-        # Loop through the list of white_pixels and identify the ordered pair that has the least neighbors
-        least_neighbors = 2
-        least_neighbors_index = 0
-        # Print progress bar with 50 hashtags
-        print("[INFO]: Progress: [                                                 ]", end=f"\r[INFO]: Progress: [")
-        for i in range(0, len(white_pixels)):
-            neighbors = 0
-            for j in range(0, len(white_pixels)):
-                # Print hashtags for progress bar based on len(white_pixels)*len(white_pixels) iterations, limited to 50
-                if len(white_pixels)*len(white_pixels) > 50:
-                    if (i*len(white_pixels) + j) % (len(white_pixels)*len(white_pixels) // 50) == 0:
-                        print("#", end="")
-                if i != j:
-                    if abs(white_pixels[i][0] - white_pixels[j][0]) <= 1:
-                        if abs(white_pixels[i][1] - white_pixels[j][1]) <= 1:
-                            neighbors += 1
-            if neighbors < least_neighbors:
-                least_neighbors = neighbors
-                least_neighbors_index = i
-        print("]")
-        # Add the pixel with the least neighbors to solved_white_pixels
-        try:
-            solved_white_pixels.append(white_pixels[least_neighbors_index])
-            # Pop the pixel with the least neighbors from the white_pixels list
-            white_pixels.pop(least_neighbors_index)
-        except IndexError:
-            print("[red][ERROR][/red]: No white pixels found in image.")
+        # Gather coords of all white pixels in an (n, 2) int32 array
+        white_pixels = extract_white_pixels(skeleton)
+        print(f"[hot_pink3][SOLVING][/hot_pink3] Coords gathered ({len(white_pixels)} white pixels).")
+        self.count("white_pixels", len(white_pixels))
+        if self.program_solver not in SOLVERS:
+            print(f"[red][ERROR][/red]: Unknown solver \"{self.program_solver}\". Available solvers: trace, {', '.join(SOLVERS)}", level="error")
+            quit()
+        print(f"[hot_pink3][SOLVING][/hot_pink3] Solving white pixels with the \"{self.program_solver}\" solver...")
+        solved_white_pixels = SOLVERS[self.program_solver](white_pixels, progress=self.progress, workers=self.program_solver_workers)
+        if len(solved_white_pixels) == 0:
+            print("[red][ERROR][/red]: No white pixels found in image.", level="error")
             return []
-        # Loop through white_pixels, identifying the closest pixel to the current pixel and popping it from the list
-        print("[hot_pink3][SOLVING][/hot_pink3] Solving white pixels...")
-        # Print progress bar with 50 hashtags
-        print("[INFO]: Progress: [                                                 ]", end=f"\r[INFO]: Progress: [")
-        ii = 0
-        iii = len(white_pixels)
-        for i in range(0, len(white_pixels)):
-            # Get the current pixel
-            current_pixel = solved_white_pixels[-1]
-            # Get the distance between the current pixel and the first pixel in white_pixels
-            distance = math.sqrt(((white_pixels[0][0] - current_pixel[0]) ** 2) + ((white_pixels[0][1] - current_pixel[1]) ** 2))
-            # Get the index of the closest pixel
-            closest_pixel_index = 0
-            # Loop through white_pixels, finding the closest pixel
-            for j in range(0, len(white_pixels)):
-                # Print hashtags for progress bar based on len(white_pixels)*len(white_pixels) iterations, limited to 50
-                if iii*iii > 50:
-                    if (ii*iii + j) % (iii*iii // 50) == 0:
-                        print("#", end="")
-                # Get the distance between the current pixel and the current pixel in white_pixels
-                current_distance = math.sqrt(((white_pixels[j][0] - current_pixel[0]) ** 2) + ((white_pixels[j][1] - current_pixel[1]) ** 2))
-                # If the current distance is less than the distance, then set the distance to the current distance and set the closest pixel index to the current index
-                if current_distance < distance:
-                    distance = current_distance
-                    closest_pixel_index = j
-            # Add the closest pixel to the solved_white_pixels list
-            solved_white_pixels.append(white_pixels[closest_pixel_index])
-            # Pop the closest pixel from the white_pixels list
-            white_pixels.pop(closest_pixel_index)
-            ii += 1
-        print("]")
         print("[hot_pink3][SOLVING][/hot_pink3] White pixels solved.")
         return solved_white_pixels
 
-    # Function to get the gcode for a list of points
+    # Trace the skeleton into a list of strokes by walking along its connected pixels (solver=trace)
+    # [NOTE]: Unlike solve_pixels, this keeps each line of the drawing as its own list of points
+    @profiled
+    def trace_skeleton(self, skeleton=None):
+        if skeleton is None:
+            skeleton = self.get_skeleton()
+        print("[purple4][AUTOCLASS][/purple4] Tracing skeleton into strokes...")
+        strokes = trace_skeleton(skeleton, progress=self.progress)
+        if len(strokes) == 0:
+            print("[red][ERROR][/red]: No white pixels found in image.", level="error")
+            return []
+        print(f"[hot_pink3][SOLVING][/hot_pink3] Traced {len(strokes)} strokes with {sum(len(stroke) for stroke in strokes)} points.")
+        self.count("white_pixels", sum(len(stroke) for stroke in strokes))
+        print("[purple4][AUTOCLASS][/purple4] Skeleton traced.")
+        return strokes
+
+    # Function to get the options that decide the size of the working canvas and of its pixels, for the pipeline functions
+    def get_pipeline_options(self):
+        return {"maximum_x": self.program_maximum_x, "maximum_y": self.program_maximum_y, "border_x": self.program_border_x, "border_y": self.program_border_y, "resolution": self.program_resolution, "mm_per_pixel": self.program_mm_per_pixel}
+
+    # Function to get the size of one pixel in printer units (mm), as (x, y)
+    def get_scale(self):
+        return pipeline.get_scale(self.get_pipeline_options())
+
+    # Reorder and reverse strokes to minimize the distance the pen travels between them
+    # Distances are measured in pixels, so the order doesn't depend on the machine size (see define_stages)
+    # [NOTE]: Solved pixels are split into strokes wherever the solver jumped to a pixel that isn't touching the last one
+    @profiled
+    def order_strokes(self, points):
+        print("[purple4][AUTOCLASS][/purple4] Ordering strokes...")
+        strokes = points if is_stroke_list(points) else split_strokes(points)
+        if not self.program_optimize_travel or len(strokes) < 2:
+            print("[purple4][AUTOCLASS][/purple4] Stroke ordering skipped.")
+            return strokes
+        print(f"[steel_blue1][ORDERING][/steel_blue1] Optimizing the order of {len(strokes)} strokes (time budget {self.program_travel_time_budget}s)...")
+        strokes, stats = order_strokes(strokes, time_budget=self.program_travel_time_budget)
+        saved = 100 * (1 - stats["travel_after"] / stats["travel_before"]) if stats["travel_before"] > 0 else 0
+        print(f"[steel_blue1][ORDERING][/steel_blue1] Travel distance reduced from {stats['travel_before']:.1f}px to {stats['travel_after']:.1f}px ({saved:.1f}% less) in {stats['seconds']:.2f}s.")
+        print("[purple4][AUTOCLASS][/purple4] Strokes ordered.")
+        return strokes
+
+    # Simplify strokes so that straight runs become a single move instead of one move per pixel
+    @profiled
+    def simplify_strokes(self, points):
+        print("[purple4][AUTOCLASS][/purple4] Simplifying strokes...")
+        strokes = points if is_stroke_list(points) else split_strokes(points)
+        if self.program_simplify == "none":
+            print("[purple4][AUTOCLASS][/purple4] Stroke simplification skipped.")
+            self.count("points", sum(len(stroke) for stroke in strokes))
+            self.count("strokes", len(strokes))
+            return strokes
+        if self.program_simplify not in SIMPLIFY_METHODS:
+            print(f"[red][ERROR][/red]: Unknown simplify method \"{self.program_simplify}\". Available methods: none, {', '.join(SIMPLIFY_METHODS)}", level="error")
+            quit()
+        strokes, stats = simplify_strokes(strokes, method=self.program_simplify, tolerance=self.program_simplify_tolerance, scale=self.get_scale())
+        print(f"[light_sea_green][SIMPLIFY][/light_sea_green] Reduced {stats['points_before']} points to {stats['points_after']} ({stats['ratio']:.1f}x fewer) with \"{self.program_simplify}\" at {self.program_simplify_tolerance}mm tolerance.")
+        self.count("points", stats["points_after"])
+        self.count("strokes", len(strokes))
+        print("[purple4][AUTOCLASS][/purple4] Strokes simplified.")
+        return strokes
+
+    # Function to stream the gcode for a list of points (or a list of strokes) in chunks of lines
+    def iter_gcode(self, points):
+        print("[purple4][AUTOCLASS][/purple4] Streaming gcode...")
+        return iter_gcode(points, self.program_maximum_x, self.program_maximum_y, self.program_border_x, self.program_border_y, self.program_initial_speed, self.program_initial_acceleration, self.program_dwell_time, self.program_debug, resolution=(self.program_width, self.program_height))
+
+    # Function to get the gcode for a list of points (or a list of strokes) as one string
+    @profiled
     def get_gcode(self, points):
         print("[purple4][AUTOCLASS][/purple4] Getting gcode...")
-        # Convert the list of pixels to gcode
-        print("[dark_olive_green3][GCODE][/dark_olive_green3] Configuring initial settings...")
-        gcode = []
-        # If the initial speed is not 0, then set the initial speed
-        if self.program_initial_speed != 0:
-            gcode.append(f"G0 F{self.program_initial_speed}\n")
-        # If the initial acceleration is not 0, then set the initial acceleration
-        if self.program_initial_acceleration != 0:
-            gcode.append(f"M204 X{self.program_initial_acceleration} Y{self.program_initial_acceleration} Z{self.program_initial_acceleration}\n")
-        # Convert the list of pixels to gcode
-        print("[dark_olive_green3][GCODE][/dark_olive_green3] Initial settings configured.")
-        print("[dark_olive_green3][GCODE][/dark_olive_green3] Converting pixels to gcode...")
-        for point in points:
-            # Convert the point coordinates to printer coordinates
-            printer_x = (((self.program_maximum_x-(2*self.program_border_x))/1000) * point[0]) + self.program_border_x
-            printer_y = (((self.program_maximum_y-(2*self.program_border_y))/1000) * point[1]) + self.program_border_y
-
-            if self.program_debug:
-                printer_z = 0
-            else:
-                printer_z = float(printer_y)
-
-            # Round all values to 3 decimal places
-            printer_x = round(printer_x, 3)
-            printer_y = round(printer_y, 3)
-            printer_z = round(printer_z, 3)
-
-            # Append the point to gcode
-            gcode.append(f"G0 X{printer_x} Y{printer_y} Z{printer_z}\n")
-        print("[dark_olive_green3][GCODE][/dark_olive_green3] Contours converted to gcode.")
-        # Insert a dwell at line 4 (found this was essential later)
-        gcode.insert(3, f"G04 P{self.program_dwell_time}\n")
-        # Convert the gcode list to a string
-        gcode = "".join(gcode)
+        gcode = "".join(self.iter_gcode(points))
         print("[purple4][AUTOCLASS][/purple4] Gcode obtained.")
         return gcode
 
-    # Write gcode to file
+    # Write gcode to file, either a string from get_gcode or chunks streamed from iter_gcode
+    @profiled
     def write_gcode(self, gcode):
         print("[purple4][AUTOCLASS][/purple4] Writing gcode to file...")
+        if self.profiler is not None:
+            gcode = self.profiler.count_lines("gcode_lines", [gcode] if isinstance(gcode, str) else gcode)
         try:
-            with open(self.program_output_filename, "w") as f:
-                f.write(gcode)
+            write_gcode(gcode, self.program_output_filename)
         except Exception as e:
-            print(f"[red][ERROR][/red] Failed to write gcode to file. Traceback: {e}")
+            print(f"[red][ERROR][/red] Failed to write gcode to file. Traceback: {e}", level="error")
             quit()
         print(f"[purple4][AUTOCLASS][/purple4] Gcode written to \"{self.program_output_filename}\"")
     
+    # Record a count (e.g. the number of white pixels) in the profile, if profiling is turned on
+    def count(self, name, value):
+        if self.profiler is not None:
+            self.profiler.count(name, value)
+
+    # Get the profile of this run as a dict, and start a new one so each run of the pipeline gets its own report
+    def take_profile(self):
+        if self.profiler is None:
+            return None
+        report = self.profiler.report()
+        self.profiler.close()
+        self.profiler = StageProfiler(self.profiler.name, track_memory=self.profiler.track_memory)
+        return report
+
+    # Write the profile of this run as JSON next to the gcode (e.g. temp/output.profile.json), and show a summary
+    def write_profile(self, filename=None):
+        report = self.take_profile()
+        if report is None:
+            return None
+        if filename is None:
+            filename = os.path.splitext(self.program_output_filename)[0] + ".profile.json"
+        try:
+            save_report(report, filename)
+        except Exception as e:
+            print(f"[red][ERROR][/red] Failed to write the profile. Traceback: {e}", level="error")
+            return report
+        if not self.show_webui:
+            rich_print(report_table(report))
+        print(f"[purple4][AUTOCLASS][/purple4] Profile written to \"{filename}\"")
+        return report
+
     # Print gcode by opening Pronterface
     # NOTE: This has only been tested on WINDOWS
     def print_gcode(self):
@@ -389,20 +561,20 @@ class AutoClass:
         # Run the pronterface -b & command (if on Linux) or pronterface.exe -b & command (if on Windows)
         if platform.system() == "Linux":
             # Get the filename path of program_output_filename without the other directories
-            temp_program_output_filename = self.program_output_filename.split("/")[-1]
+            temp_program_output_filename = os.path.basename(self.program_output_filename)
             # Check if Pronterface is installed
             if not os.path.exists("/usr/bin/pronterface"):
-                print("[red][ERROR][/red]: Pronterface is not installed. Please install it with `sudo apt install pronterface`.")
+                print("[red][ERROR][/red]: Pronterface is not installed. Please install it with `sudo apt install pronterface`.", level="error")
                 return False
-            # CD into maindirectory and then run the command "sudo pronterface -a -e \"load temp_program_output_filename print\"
-            os.system(f"cd \"{os.path.join(maindirectory, 'temp')}\" && sudo pronterface -a -e \"load {temp_program_output_filename}\"")
+            # CD into the output folder (temp, or a WebUI job's folder) and then run the command "sudo pronterface -a -e \"load temp_program_output_filename print\"
+            os.system(f"cd \"{os.path.dirname(self.program_output_filename)}\" && sudo pronterface -a -e \"load {temp_program_output_filename}\"")
         elif platform.system() == "Windows":
             # Get the filename path of program_output_filename without the other directories
-            temp_program_output_filename = self.program_output_filename.split("\\")[-1]
-            # CD into maindirectory and then run the command "pronterface.exe -a -e \"load temp_program_output_filename print\"
-            os.system(f"cd \"{os.path.join(maindirectory, 'temp')}\" && ..\\pronterface.exe -a -e \"load {temp_program_output_filename}\"")
+            temp_program_output_filename = os.path.basename(self.program_output_filename)
+            # CD into the output folder (temp, or a WebUI job's folder) and then run the command "pronterface.exe -a -e \"load temp_program_output_filename print\"
+            os.system(f"cd \"{os.path.dirname(self.program_output_filename)}\" && \"{os.path.join(maindirectory, 'pronterface.exe')}\" -a -e \"load {temp_program_output_filename}\"")
         else:
-            print("[red][ERROR][/red]: Unsupported operating system. Please use Linux or Windows. Gcode will not be printed.")
+            print("[red][ERROR][/red]: Unsupported operating system. Please use Linux or Windows. Gcode will not be printed.", level="error")
             return False
         print("[purple4][AUTOCLASS][/purple4] Gcode printed.")
         return True
\ No newline at end of file
@@ -0,0 +1,120 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, glob # General
+    from concurrent.futures import ProcessPoolExecutor, as_completed # Process pool
+    from rich import print as rich_print # Pretty print
+    from rich.table import Table # Summary table
+    from rich.traceback import install # Pretty traceback
+    install() # Install traceback
+    from python.logger import log_print, set_log_level # Logging
+    from python.pipeline import convert, PipelineError # Image -> gcode conversion
+    from python.gcode import write_gcode # Gcode writer
+    from python.cache import cache_from_options # Result cache
+    from python.profiler import StageProfiler # Stage profiling
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# File extensions picked up when a directory is given as the batch input
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
+# Custom low-level functions
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
+
+# Find the images for a batch, from either a directory or a glob pattern (e.g. "scans/*.png")
+def find_images(source):
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+# Set up each worker process, keeping the console quiet so only the batch progress is shown
+def init_worker(log_level):
+    set_log_level(log_level)
+
+# Convert one image with the conversion pipeline (runs inside a worker process)
+# Never raises, so one bad image can't stop the rest of the batch
+def convert_image(input_path, output_path, opts_dict):
+    started = time.perf_counter()
+    result = {"input": input_path, "output": output_path, "status": "ok", "moves": 0, "seconds": 0.0, "error": ""}
+    profiler = StageProfiler(os.path.basename(input_path), track_memory=True) if opts_dict.get("profile", False) else None
+    try:
+        with open(input_path, "rb") as f:
+            conversion = convert(f.read(), opts_dict, cache=cache_from_options(opts_dict), profiler=profiler)
+        if profiler is None:
+            write_gcode(conversion.iter_gcode(), output_path)
+        else:
+            with profiler.stage("write_gcode"):
+                write_gcode(profiler.count_lines("gcode_lines", conversion.iter_gcode()), output_path)
+            # Write the profile next to the gcode (e.g. output_dir/image.profile.json)
+            profiler.write_report(os.path.splitext(output_path)[0] + ".profile.json")
+        result["moves"] = conversion.moves
+    except PipelineError as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+# Convert every image matching "source" into a gcode file in "output_dir", spread across a pool of worker processes
+# Returns a list of per-image results
+def run_batch(opts_dict, source, output_dir, workers=0):
+    images = find_images(source)
+    if not images:
+        print(f"[red][ERROR][/red]: No images found for batch input \"{source}\".", level="error")
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    worker_log_level = "debug" if str(opts_dict.get("log_level", "info")).lower() == "debug" else "warning"
+    # Images are already converted in parallel, so solver=components shouldn't start a pool of its own in every worker
+    opts_dict = dict(opts_dict, solver_workers=1)
+    print(f"[orange3][BATCH][/orange3] Converting {len(images)} images with {workers} workers into \"{output_dir}\"...")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(worker_log_level,)) as executor:
+        futures = {}
+        for input_path in images:
+            output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".gcode")
+            futures[executor.submit(convert_image, input_path, output_path, opts_dict)] = (input_path, output_path)
+        for future in as_completed(futures):
+            input_path, output_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                result = {"input": input_path, "output": output_path, "status": "failed", "moves": 0, "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            status = "[green]ok[/green]" if result["status"] == "ok" else "[red]failed[/red]"
+            print(f"[orange3][BATCH][/orange3] ({len(results)}/{len(images)}) {os.path.basename(input_path)}: {status} in {result['seconds']:.2f}s")
+    print_summary(results, time.perf_counter() - started)
+    return results
+
+# Print a table with the timing and status of every image in the batch
+def print_summary(results, total_seconds):
+    table = Table(title="Batch summary")
+    table.add_column("Image")
+    table.add_column("Status")
+    table.add_column("Moves", justify="right")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Error")
+    for result in sorted(results, key=lambda result: result["input"]):
+        status = "[green]ok[/green]" if result["status"] == "ok" else "[red]failed[/red]"
+        table.add_row(os.path.basename(result["input"]), status, str(result["moves"]), f"{result['seconds']:.2f}", result["error"])
+    rich_print(table)
+    failed = sum(1 for result in results if result["status"] != "ok")
+    print(f"[orange3][BATCH][/orange3] Finished {len(results)} images in {total_seconds:.2f}s ({len(results) - failed} converted, {failed} failed).")
@@ -0,0 +1,224 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, json, math, platform, subprocess, statistics # General
+    import cv2 # OpenCV
+    import numpy as np # Numpy
+    from rich import print as rich_print # Pretty print
+    from rich.table import Table # Result tables
+    from python.logger import log_print, set_log_level # Logging
+    from python.autoclass import AutoClass # Main class
+    from python.profiler import StageProfiler # Stage profiling
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
+# Custom low-level functions
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
+
+# Side length of the generated images, in pixels (the same as the default working resolution, so resizing doesn't change them)
+SYNTHETIC_SIZE = 1000
+
+# Thickness of the lines drawn in generated images, in pixels
+SYNTHETIC_THICKNESS = 3
+
+# Draw "lines" evenly spaced diagonal lines in black on white, like the shading of a drawing
+def hatching_image(lines, size=SYNTHETIC_SIZE):
+    image = np.full((size, size, 3), 255, np.uint8)
+    spacing = 2 * size / (lines + 1)
+    for number in range(1, lines + 1):
+        offset = int(number * spacing)
+        cv2.line(image, (offset, 0), (offset - size, size), (0, 0, 0), SYNTHETIC_THICKNESS)
+    return image
+
+# Draw "strokes" short lines at random places, so the skeleton has many disconnected strokes
+def scattered_image(strokes, size=SYNTHETIC_SIZE, seed=0):
+    image = np.full((size, size, 3), 255, np.uint8)
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(20, size - 20, (strokes, 2))
+    angles = rng.uniform(0, 2 * math.pi, strokes)
+    lengths = rng.integers(5, 20, strokes)
+    for (x, y), angle, length in zip(starts, angles, lengths):
+        end = (int(x + length * math.cos(angle)), int(y + length * math.sin(angle)))
+        cv2.line(image, (int(x), int(y)), end, (0, 0, 0), SYNTHETIC_THICKNESS)
+    return image
+
+# Draw a spiral with "turns" turns, so the skeleton is one long stroke (64 turns is about 100k pixels)
+def spiral_image(turns, size=SYNTHETIC_SIZE):
+    image = np.full((size, size, 3), 255, np.uint8)
+    center = size / 2
+    spacing = (center - 10) / turns
+    angles = np.linspace(0, 2 * math.pi * turns, turns * 720)
+    radii = spacing * angles / (2 * math.pi)
+    points = np.stack([center + radii * np.cos(angles), center + radii * np.sin(angles)], axis=1).round().astype(np.int32)
+    cv2.polylines(image, [points], False, (0, 0, 0), SYNTHETIC_THICKNESS)
+    return image
+
+# Generated inputs, as the function that draws them and the sizes to draw them at (for the scaling curves)
+SYNTHETIC_INPUTS = {
+    "hatching": (hatching_image, [8, 16, 32, 64, 128]),
+    "scattered": (scattered_image, [50, 200, 800, 3200]),
+    "spiral": (spiral_image, [8, 16, 32, 64]),
+}
+
+# Write the example images and the generated ones into "directory", and get a list of (family, name, path)
+def prepare_inputs(directory):
+    os.makedirs(directory, exist_ok=True)
+    inputs = []
+    examples_directory = os.path.join(maindirectory, "examples")
+    for filename in sorted(os.listdir(examples_directory)):
+        if filename.lower().endswith(".png"):
+            inputs.append(("examples", os.path.splitext(filename)[0], os.path.join(examples_directory, filename)))
+    for family, (draw, sizes) in SYNTHETIC_INPUTS.items():
+        for size in sizes:
+            name = f"{family}_{size}"
+            path = os.path.join(directory, name + ".png")
+            if not os.path.exists(path):
+                cv2.imwrite(path, draw(size))
+            inputs.append((family, name, path))
+    return inputs
+
+# Run the whole AutoClass pipeline on one image (the same stages as standalone mode without display), and get its profile
+def run_pipeline(opts_dict, input_path, output_path, track_memory=False):
+    opts = dict(opts_dict, input=input_path, output=output_path, camera_bounds="(0,0)(0,0)", display=False, execute=False, pi_mode=False, webui=False)
+    auto_obj = AutoClass(opts)
+    auto_obj.profiler = StageProfiler(os.path.basename(input_path), track_memory=track_memory)
+    try:
+        auto_obj.preprocess_image()
+        auto_obj.write_gcode(auto_obj.iter_gcode(auto_obj.get_strokes()))
+        return auto_obj.profiler.report()
+    finally:
+        auto_obj.profiler.close()
+        auto_obj.cleanup()
+
+# Get the git commit of the program, to tell benchmark results of different versions apart
+def get_version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=maindirectory, capture_output=True, text=True, timeout=5).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+# Benchmark one input "repeat" times, keeping the median time of each stage
+def benchmark_input(opts_dict, family, name, input_path, output_path, repeat):
+    reports = [run_pipeline(opts_dict, input_path, output_path) for _ in range(repeat)]
+    stages = {}
+    for stage in reports[0]["stages"]:
+        stages[stage["stage"]] = statistics.median(record["wall_seconds"] for report in reports for record in report["stages"] if record["stage"] == stage["stage"])
+    seconds = statistics.median(report["wall_seconds"] for report in reports)
+    pixels = reports[0]["counts"].get("white_pixels", 0)
+    return {
+        "family": family,
+        "name": name,
+        "white_pixels": pixels,
+        "gcode_lines": reports[0]["counts"].get("gcode_lines", 0),
+        "seconds": seconds,
+        "pixels_per_second": pixels / seconds if seconds > 0 else 0.0,
+        "stages": stages,
+    }
+
+# Estimate how each family's time grows with the number of white pixels, as the exponent k in time ~ n^k
+# (fit as the slope of log(time) against log(n), so 1 is linear and 2 is quadratic)
+def scaling_exponents(results):
+    exponents = {}
+    for family in SYNTHETIC_INPUTS:
+        points = [(math.log(result["white_pixels"]), math.log(result["seconds"])) for result in results if result["family"] == family and result["white_pixels"] > 0 and result["seconds"] > 0]
+        if len(points) < 2:
+            continue
+        x, y = np.array(points).T
+        exponents[family] = {"total": float(np.polyfit(x, y, 1)[0])}
+        for stage in ("thin_image", "solve_pixels", "trace_skeleton", "order_strokes", "simplify_strokes", "write_gcode"):
+            stage_points = [(math.log(result["white_pixels"]), math.log(result["stages"][stage])) for result in results if result["family"] == family and result["white_pixels"] > 0 and result["stages"].get(stage, 0) > 0]
+            if len(stage_points) >= 2:
+                x, y = np.array(stage_points).T
+                exponents[family][stage] = float(np.polyfit(x, y, 1)[0])
+    return exponents
+
+# Benchmark the pipeline on the example images and the generated ones, save the results as JSON and show a summary
+# If "baseline" is the path of an earlier results file, each input's time is compared against it
+def run_benchmark(opts_dict, baseline="", repeat=3, output_dir=None):
+    output_dir = output_dir or os.path.join(maindirectory, "temp", "benchmark")
+    inputs = prepare_inputs(os.path.join(output_dir, "inputs"))
+    print(f"[medium_purple1][BENCHMARK][/medium_purple1] Benchmarking {len(inputs)} inputs, {repeat} runs each...")
+    # Keep the pipeline's own messages out of the way, unless they were asked for
+    log_level = str(opts_dict.get("log_level", "info")).lower()
+    set_log_level("debug" if log_level == "debug" else "warning")
+    results = []
+    try:
+        for family, name, input_path in inputs:
+            result = benchmark_input(opts_dict, family, name, input_path, os.path.join(output_dir, "output.gcode"), repeat)
+            results.append(result)
+            log_print(f"[medium_purple1][BENCHMARK][/medium_purple1] ({len(results)}/{len(inputs)}) {name}: {result['white_pixels']} pixels in {result['seconds']:.3f}s", f"{script_name}.log", level="warning")
+    finally:
+        set_log_level(log_level)
+    report = {
+        "version": get_version(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "options": {key: opts_dict.get(key) for key in ("solver", "thinning", "optimize_travel", "travel_time_budget", "simplify", "simplify_tolerance")},
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+    filename = os.path.join(output_dir, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}-{report['version']}.json")
+    with open(filename, "w") as f:
+        json.dump(report, f, indent=4)
+    baseline_report = None
+    if baseline:
+        try:
+            with open(baseline) as f:
+                baseline_report = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[red][ERROR][/red]: Could not read the baseline results \"{baseline}\". Traceback: {e}", level="error")
+    print_results(report, baseline_report)
+    print(f"[medium_purple1][BENCHMARK][/medium_purple1] Results saved to \"{filename}\"")
+    return report
+
+# Print a table of every input's time and throughput (against the baseline, if given), and the scaling of each family
+def print_results(report, baseline_report=None):
+    baseline_results = {result["name"]: result for result in baseline_report["results"]} if baseline_report else {}
+    table = Table(title=f"Benchmark {report['version']}" + (f" vs {baseline_report['version']}" if baseline_report else ""))
+    table.add_column("Input")
+    table.add_column("White pixels", justify="right")
+    table.add_column("Gcode lines", justify="right")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Pixels/s", justify="right")
+    table.add_column("Slowest stage")
+    if baseline_report:
+        table.add_column("Baseline (s)", justify="right")
+        table.add_column("Speedup", justify="right")
+    for result in report["results"]:
+        slowest = max(result["stages"], key=result["stages"].get)
+        row = [result["name"], str(result["white_pixels"]), str(result["gcode_lines"]), f"{result['seconds']:.3f}", f"{result['pixels_per_second']:,.0f}", f"{slowest} ({result['stages'][slowest]:.3f}s)"]
+        if baseline_report:
+            before = baseline_results.get(result["name"])
+            if before is None:
+                row += ["-", "-"]
+            else:
+                speedup = before["seconds"] / result["seconds"] if result["seconds"] > 0 else 0.0
+                color = "green" if speedup >= 1.05 else "red" if speedup <= 0.95 else "white"
+                row += [f"{before['seconds']:.3f}", f"[{color}]{speedup:.2f}x[/{color}]"]
+        table.add_row(*row)
+    rich_print(table)
+    scaling_table = Table(title="Scaling (time ~ pixels^k)")
+    scaling_table.add_column("Input")
+    scaling_table.add_column("Stage")
+    scaling_table.add_column("k", justify="right")
+    for family, exponents in report["scaling"].items():
+        for stage, exponent in exponents.items():
+            scaling_table.add_row(family, stage, f"{exponent:.2f}")
+    rich_print(scaling_table)
@@ -0,0 +1,129 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, json, hashlib, threading, zipfile, zlib # General
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Get a hash of an image, from either the bytes of an image file or an image array
+def hash_image(image):
+    digest = hashlib.sha256()
+    if isinstance(image, np.ndarray):
+        digest.update(f"{image.shape}{image.dtype}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(image).data)
+    else:
+        digest.update(image)
+    return digest.hexdigest()
+
+# Pack a list of strokes into two arrays (all points, and the length of each stroke) for saving
+def pack_strokes(strokes):
+    lengths = np.array([len(stroke) for stroke in strokes], dtype=np.int64)
+    points = np.concatenate(strokes).astype(np.int32) if len(strokes) > 0 else np.zeros((0, 2), np.int32)
+    return points, lengths
+
+# Unpack strokes saved with pack_strokes
+def unpack_strokes(points, lengths):
+    return np.split(points, np.cumsum(lengths)[:-1]) if len(lengths) > 0 else []
+
+# Get a ResultCache set up from the program options, or None if the cache is turned off
+def cache_from_options(opts_dict):
+    if not opts_dict.get("cache", True):
+        return None
+    return ResultCache(max_bytes=int(opts_dict.get("cache_size_mb", 256)) * 1024 * 1024)
+
+# Cache of stage results on local disk, addressed by a hash of everything that went into them
+# Each entry is a compressed .npz file; the least recently used entries are deleted once the cache outgrows max_bytes
+# Keys are chained (e.g. the solved strokes' key includes the skeleton's key), so a change to one stage's options
+# only misses the cache from that stage onwards
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.directory = directory or os.path.join(maindirectory, "temp", "cache")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    # Build a key from a stage name and the values it depends on
+    def key(self, stage, *parts):
+        return stage + "-" + hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    # Load the arrays stored under "key" as a dict, or None if they aren't cached
+    # An entry that can't be read (e.g. truncated) or is missing one of the arrays in "names" is deleted and counts as a miss
+    def load(self, key, *names):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            missing = [name for name in names if name not in arrays]
+            if missing:
+                raise KeyError(f"Missing {', '.join(missing)}")
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile, zlib.error):
+            self.remove(key)
+            return None
+        return arrays
+
+    # Delete the entry stored under "key", if there is one
+    def remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    # Store arrays under "key", then evict old entries if the cache is too big
+    def save(self, key, **arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write to a temporary file first, so a reader (or another process) never sees half an entry
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+        self.evict()
+
+    # Delete the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        with self.lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".npz")]
+            except OSError:
+                return
+            stats = []
+            for entry in entries:
+                try:
+                    stats.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+                except OSError:
+                    continue
+            total = sum(size for _, size, _ in stats)
+            for _, size, path in sorted(stats):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    # Delete every entry
+    def clear(self):
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                return
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".npz"):
+                    os.remove(entry.path)
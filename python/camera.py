@@ -0,0 +1,128 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, threading # General
+    from collections import deque # Ring buffer
+    import cv2 # OpenCV
+    from python.logger import log_print # Logging
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
+# Custom low-level functions
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
+
+# Raised when the camera can't be opened or stops sending frames
+class CameraError(Exception):
+    pass
+
+# Measure how sharp a frame is, as the variance of its Laplacian (blurry frames have few strong edges)
+def frame_sharpness(frame):
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(frame, cv2.CV_64F).var()
+
+# Keeps a camera open and grabs frames into a ring buffer on a background thread, so a capture never waits for the
+# device to open and the camera's auto exposure has already settled
+# The camera is opened on the first capture (or start()), and released by stop()
+class CameraService:
+    def __init__(self, camera_number=0, buffer_size=8, warmup_frames=10, timeout=5.0):
+        self.camera_number = camera_number
+        # Frames grabbed right after opening are often underexposed, so they are thrown away
+        self.warmup_frames = warmup_frames
+        self.timeout = timeout
+        self.frames = deque(maxlen=buffer_size)
+        self.frame_added = threading.Condition()
+        self.capture = None
+        self.thread = None
+        self.running = False
+        self.error = ""
+
+    # Open the camera and start grabbing frames, if that isn't already happening
+    def start(self):
+        if self.running:
+            return
+        # Clean up after a camera that stopped sending frames
+        self.stop()
+        print(f"[sky_blue1][CAMERA][/sky_blue1] Opening camera {self.camera_number}...")
+        self.capture = cv2.VideoCapture(self.camera_number)
+        if not self.capture.isOpened():
+            self.capture.release()
+            self.capture = None
+            raise CameraError(f"Could not open camera {self.camera_number}")
+        # Keep the driver's own queue short, so buffered frames are always recent
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.frames.clear()
+        self.error = ""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CameraService", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        skipped = 0
+        failures = 0
+        while self.running:
+            success, frame = self.capture.read()
+            if not success:
+                failures += 1
+                if failures >= 50:
+                    self.error = f"Camera {self.camera_number} stopped sending frames"
+                    self.running = False
+                    break
+                time.sleep(0.02)
+                continue
+            failures = 0
+            if skipped < self.warmup_frames:
+                skipped += 1
+                continue
+            with self.frame_added:
+                self.frames.append(frame)
+                self.frame_added.notify_all()
+        with self.frame_added:
+            self.frame_added.notify_all()
+
+    # Wait until the buffer holds at least "count" frames (or as many as it can), and get a copy of them
+    def _wait_for_frames(self, count):
+        self.start()
+        deadline = time.monotonic() + self.timeout
+        with self.frame_added:
+            while len(self.frames) < min(count, self.frames.maxlen) and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.frame_added.wait(remaining)
+            frames = list(self.frames)
+        if not frames:
+            raise CameraError(self.error or f"No frames received from camera {self.camera_number} within {self.timeout}s")
+        return frames[-count:]
+
+    # Get the most recent frame
+    def latest_frame(self):
+        return self._wait_for_frames(1)[-1]
+
+    # Get the sharpest of the "count" most recent frames (e.g. to skip ones blurred by movement)
+    def best_frame(self, count=5):
+        if count <= 1:
+            return self.latest_frame()
+        return max(self._wait_for_frames(count), key=frame_sharpness)
+
+    # Stop grabbing frames and release the camera
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+            print(f"[sky_blue1][CAMERA][/sky_blue1] Camera {self.camera_number} released.")
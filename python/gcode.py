@@ -0,0 +1,94 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# The dwell always sits at line 4 of the program (after the settings and the first move)
+DWELL_LINE_INDEX = 3
+
+# Size of the write buffer used when streaming gcode to a file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Number of moves formatted together in each chunk of a streamed program
+FORMAT_CHUNK_SIZE = 8192
+
+# Yield the initial speed/acceleration settings
+def iter_header(initial_speed, acceleration):
+    # If the initial speed is not 0, then set the initial speed
+    if initial_speed != 0:
+        yield f"G0 F{initial_speed}\n"
+    # If the initial acceleration is not 0, then set the initial acceleration
+    if acceleration != 0:
+        yield f"M204 X{acceleration} Y{acceleration} Z{acceleration}\n"
+
+# Join a list of strokes into one (n, 2) array of points
+def _as_point_array(points):
+    if len(points) > 0 and np.ndim(points[0]) == 2:
+        return np.concatenate(points)
+    return np.asarray(points).reshape(-1, 2)
+
+# Convert pixel coords to printer coords for an array of values along one axis
+# "resolution" is the number of pixels the working canvas has along that axis
+def to_printer_coords(values, maximum, border, resolution=1000):
+    return (((maximum-(2*border))/resolution) * values) + border
+
+# Format printer coords exactly like round(value, 3) in an f-string, the way every move has always been written
+def _format_coords(coords):
+    return [str(round(value, 3)) for value in coords.tolist()]
+
+# Yield the moves for all points in chunks of formatted text
+# Accepts an (n, 2) array of points or a list of strokes. Each distinct x/y value is only converted and formatted once,
+# then every line is assembled from those pieces with numpy, which keeps the output byte-identical to formatting each point
+def iter_moves(points, maximum_x, maximum_y, border_x, border_y, debug=False, chunk_size=FORMAT_CHUNK_SIZE, resolution=(1000, 1000)):
+    points = _as_point_array(points)
+    if len(points) == 0:
+        return
+    unique_x, x_index = np.unique(points[:, 0], return_inverse=True)
+    unique_y, y_index = np.unique(points[:, 1], return_inverse=True)
+    # Lookup tables of the text for each distinct value, as object arrays so joining them stays in C
+    x_text = np.array([f"G0 X{value}" for value in _format_coords(to_printer_coords(unique_x, maximum_x, border_x, resolution[0]))], dtype=object)
+    y_values = _format_coords(to_printer_coords(unique_y, maximum_y, border_y, resolution[1]))
+    if debug:
+        yz_text = np.array([f" Y{value} Z0\n" for value in y_values], dtype=object)
+    else:
+        yz_text = np.array([f" Y{value} Z{value}\n" for value in y_values], dtype=object)
+    for start in range(0, len(points), chunk_size):
+        yield "".join((x_text[x_index[start:start + chunk_size]] + yz_text[y_index[start:start + chunk_size]]).tolist())
+
+# Yield the whole gcode program in chunks of lines, so it can be streamed to a file or HTTP response without building it in memory
+# "resolution" is the (width, height) of the working canvas the points were found on
+def iter_gcode(points, maximum_x, maximum_y, border_x, border_y, initial_speed, acceleration, dwell_time, debug=False, chunk_size=FORMAT_CHUNK_SIZE, resolution=(1000, 1000)):
+    points = _as_point_array(points)
+    header = list(iter_header(initial_speed, acceleration))
+    yield from header
+    # The dwell goes straight into the stream at its line, instead of being spliced in afterwards
+    moves_before_dwell = DWELL_LINE_INDEX - len(header)
+    yield from iter_moves(points[:moves_before_dwell], maximum_x, maximum_y, border_x, border_y, debug, chunk_size, resolution)
+    yield f"G04 P{dwell_time}\n"
+    yield from iter_moves(points[moves_before_dwell:], maximum_x, maximum_y, border_x, border_y, debug, chunk_size, resolution)
+
+# Get the first few lines of a streamed gcode program as one string (for previews)
+def head_gcode(chunks, lines):
+    head = []
+    for chunk in chunks:
+        head.extend(chunk.splitlines(keepends=True))
+        if len(head) >= lines:
+            break
+    return "".join(head[:lines])
+
+# Write gcode (a string, or an iterable of lines/chunks) through a single buffered file handle
+def write_gcode(gcode, filename):
+    with open(filename, "w", buffering=WRITE_BUFFER_SIZE) as f:
+        if isinstance(gcode, str):
+            f.write(gcode)
+        else:
+            f.writelines(gcode)
@@ -0,0 +1,209 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, uuid, shutil, threading # General
+    from concurrent.futures import ThreadPoolExecutor # Worker pool
+    from python.logger import log_print # Logging
+    from python.autoclass import AutoClass # AutoClass
+    from python.progress import ProgressReporter # Progress reporting
+    from python.preview import shrink_preview # Preview images
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
+# Custom low-level functions
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
+
+# Raised when a job can't be queued because too many jobs are already waiting or running
+class JobQueueFull(Exception):
+    pass
+
+# One browser session's conversion, with its own AutoClass, its own folder under temp/jobs and its current background task
+# Jobs created through the API have no AutoClass, and only run a single pipeline.convert() in the background
+class Job:
+    def __init__(self, job_id, directory, auto_obj=None):
+        self.id = job_id
+        self.directory = directory
+        self.auto_obj = auto_obj
+        self.progress = auto_obj.progress if auto_obj is not None else ProgressReporter()
+        # The background task (e.g. "solve"), its future, and its result or error once it has finished
+        self.task = ""
+        self.future = None
+        self.result = None
+        self.error = ""
+        # The exception the task raised, if any (e.g. a PipelineError to report as a bad request)
+        self.exception = None
+        # Image at each demo step, kept as a small array (see set_preview) and only encoded if the browser asks for its preview
+        # Map of stage -> (version, image), where the version changes every time a stage's image is replaced
+        self.previews = {}
+        self.preview_version = 0
+        # AutoClass isn't thread-safe, so requests and tasks for the same job take turns
+        self.lock = threading.RLock()
+
+    # Get the path of a file in this job's folder
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    # Keep the image of a demo step so its preview can be served later
+    # Only a copy shrunk to the preview size is kept, so a job doesn't hold on to a full-size array (or float map) per step
+    def set_preview(self, stage, image):
+        self.preview_version += 1
+        self.previews[stage] = (self.preview_version, shrink_preview(image))
+
+    # Get whether the job has a background task waiting or running
+    def is_busy(self):
+        return self.future is not None and not self.future.done()
+
+    # Get the state of the background task: "idle", "queued", "running", "done" or "failed"
+    def status(self):
+        if self.future is None:
+            return "idle"
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.error else "done"
+
+    # Forget the last background task and its result
+    def reset(self):
+        self.task = ""
+        self.future = None
+        self.result = None
+        self.error = ""
+        self.exception = None
+
+    # Get the state of the job as a dict (e.g. to send to the browser)
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "task": self.task,
+            "status": self.status(),
+            "error": self.error,
+            "progress": self.progress.snapshot(),
+        }
+
+# Keeps one Job per browser session and runs their heavy stages on a bounded pool of worker threads
+# [NOTE]: Threads rather than processes, since each job's state lives on its AutoClass. The web server keeps answering
+# requests while a job solves, and max_pending stops a crowd of users from piling up an endless queue
+class JobManager:
+    def __init__(self, opts_dict, max_workers=2, max_pending=8, max_jobs=32, job_ttl=3600):
+        self.opts_dict = opts_dict
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.job_ttl = job_ttl
+        self.jobs_directory = os.path.join(maindirectory, "temp", "jobs")
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="JobWorker")
+        self.max_workers = max_workers
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    # Create a new job with a unique ID, plus an AutoClass and an empty folder unless "with_autoclass" is False
+    def create_job(self, with_autoclass=True):
+        self.remove_expired()
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(self.jobs_directory, job_id)
+        if with_autoclass:
+            os.makedirs(directory, exist_ok=True)
+            # Every job reads and writes its own files, and leaves the GPIO to the main program
+            job_opts = dict(self.opts_dict, input=os.path.join(directory, "input.png"), output=os.path.join(directory, os.path.basename(str(self.opts_dict["output"]))), pi_mode=False)
+            job = Job(job_id, directory, AutoClass(job_opts))
+        else:
+            job = Job(job_id, directory)
+        with self.lock:
+            self.jobs[job_id] = job
+        print(f"[dark_cyan][JOBS][/dark_cyan] Created job {job_id}.")
+        return job
+
+    # Get a job by its ID, or None if it doesn't exist (or has expired)
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            job.last_used = time.time()
+        return job
+
+    # Queue "function(*args)" as the job's background task, replacing the result of its last one
+    # Raises JobQueueFull if too many tasks are already waiting or running
+    def submit(self, job, task, function, *args):
+        with self.lock:
+            if job.is_busy():
+                return job.future
+            pending = sum(1 for other in self.jobs.values() if other.is_busy())
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs are already queued or running, please try again in a moment.")
+            job.reset()
+            job.task = task
+            job.future = self.executor.submit(self._run, job, function, args)
+        print(f"[dark_cyan][JOBS][/dark_cyan] Queued \"{task}\" for job {job.id} ({pending + 1} pending).")
+        return job.future
+
+    def _run(self, job, function, args):
+        started = time.perf_counter()
+        with job.lock:
+            try:
+                job.result = function(*args)
+            except SystemExit:
+                # AutoClass calls quit() on errors, after logging the reason to autoclass.log
+                job.error = f"The \"{job.task}\" step stopped, see logs/autoclass.log for details."
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.exception = e
+        if job.error:
+            print(f"[red][ERROR][/red] Job {job.id} failed \"{job.task}\": {job.error}", level="error")
+        else:
+            print(f"[dark_cyan][JOBS][/dark_cyan] Job {job.id} finished \"{job.task}\" in {time.perf_counter() - started:.2f}s.")
+        return job.result
+
+    # Delete a job and its folder
+    def remove_job(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        if job.future is not None:
+            job.future.cancel()
+        with job.lock:
+            if job.auto_obj is not None:
+                job.auto_obj.cleanup()
+            shutil.rmtree(job.directory, ignore_errors=True)
+        print(f"[dark_cyan][JOBS][/dark_cyan] Removed job {job_id}.")
+
+    # Delete jobs that haven't been used for job_ttl seconds, then the least recently used ones if there are too many
+    def remove_expired(self):
+        with self.lock:
+            idle_jobs = sorted((job for job in self.jobs.values() if not job.is_busy()), key=lambda job: job.last_used)
+            expired = [job for job in idle_jobs if time.time() - job.last_used > self.job_ttl]
+            extra = len(self.jobs) - len(expired) - (self.max_jobs - 1)
+            if extra > 0:
+                expired += [job for job in idle_jobs if job not in expired][:extra]
+        for job in expired:
+            self.remove_job(job.id)
+
+    # Get the number of jobs and how many of them are queued or running
+    def stats(self):
+        with self.lock:
+            statuses = [job.status() for job in self.jobs.values()]
+        return {
+            "jobs": len(statuses),
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+        }
+
+    # Stop the worker threads and delete every job
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        for job_id in list(self.jobs):
+            self.remove_job(job_id)
@@ -0,0 +1,131 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, atexit, queue, threading # General
+    from rich import print as rich_print # Pretty print
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Log levels, from most to least verbose
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+# Number of rotated copies kept of each log file (e.g. main.log.1)
+LOG_BACKUP_COUNT = 1
+
+# Writes log lines from a background thread, keeping one open, buffered handle per log file
+class LogWriter:
+    def __init__(self, log_directory):
+        self.log_directory = log_directory
+        self.queue = queue.SimpleQueue()
+        # Map of log filename -> [file handle, current size in bytes]
+        self.files = {}
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    # Queue a line to be written, starting the writer thread if needed
+    def write(self, log_filename, text, max_file_mb=10):
+        # The thread doesn't survive a fork (e.g. worker processes), so start a fresh one in the new process
+        if self.pid != os.getpid():
+            self._start()
+        self.queue.put((log_filename, f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {text}\n", max_file_mb * 1024 * 1024))
+
+    # Write everything still queued and close all log files
+    def close(self):
+        if self.thread is not None and self.pid == os.getpid():
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self.files = {}
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            # Write everything else that is already queued before flushing, so bursts cost one flush
+            while item is not None:
+                self._write(*item)
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                running = False
+            for handle, _ in self.files.values():
+                handle.flush()
+        for handle, _ in self.files.values():
+            handle.close()
+        self.files = {}
+
+    def _write(self, log_filename, line, max_bytes):
+        log_file_path = os.path.join(self.log_directory, log_filename)
+        try:
+            if log_filename not in self.files:
+                os.makedirs(self.log_directory, exist_ok=True)
+                handle = open(log_file_path, "a", encoding="utf-8")
+                self.files[log_filename] = [handle, handle.tell()]
+            entry = self.files[log_filename]
+            data_size = len(line.encode("utf-8"))
+            # Rotate the log instead of clearing it once it gets too big
+            if entry[1] > 0 and entry[1] + data_size > max_bytes:
+                entry[0].close()
+                self._rotate(log_file_path)
+                entry[0] = open(log_file_path, "a", encoding="utf-8")
+                entry[1] = 0
+            entry[0].write(line)
+            entry[1] += data_size
+        except Exception as e:
+            self.files.pop(log_filename, None)
+            rich_print(f"[red][ERROR][/red]: {e}")
+            rich_print(f"[red][ERROR][/red]: Could not write to log file at {log_file_path}.")
+
+    # Shift log -> log.1 -> log.2 ..., dropping the oldest copy
+    def _rotate(self, log_file_path):
+        for number in range(LOG_BACKUP_COUNT, 0, -1):
+            source = log_file_path if number == 1 else f"{log_file_path}.{number - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{log_file_path}.{number}")
+
+# Shared writer for all of the program's log files
+log_writer = LogWriter(os.path.join(maindirectory, "logs"))
+atexit.register(log_writer.close)
+
+# Messages below this level are skipped entirely (not formatted, logged or shown)
+log_level = LOG_LEVELS["info"]
+
+# Set the minimum level of messages to log, e.g. "debug" or "warning"
+def set_log_level(level):
+    global log_level
+    if str(level).lower() not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level \"{level}\". Available levels: {', '.join(LOG_LEVELS)}")
+    log_level = LOG_LEVELS[str(level).lower()]
+
+# Check whether messages at a level would be logged, so callers can skip building expensive messages
+def is_enabled(level="info"):
+    return LOG_LEVELS[level] >= log_level
+
+# Log a message to a log file and print it to the console with Rich markup
+def log_print(text="", log_filename="gcodepainter.log", end="\n", max_file_mb=10, level="info"):
+    if LOG_LEVELS[level] < log_level:
+        return
+    log_writer.write(log_filename, text, max_file_mb)
+    rich_print(text, end=end)
@@ -0,0 +1,207 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import time # General
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Moves smaller than this are treated as rounding noise rather than an improvement
+IMPROVEMENT_EPSILON = 1e-9
+
+# Split an ordered (n, 2) array of points into strokes wherever two consecutive points are not touching
+def split_strokes(points):
+    points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    if len(points) == 0:
+        return []
+    jumps = np.abs(np.diff(points, axis=0)).max(axis=1) > 1
+    return np.split(points, np.flatnonzero(jumps) + 1)
+
+# Total pen-up distance when drawing the strokes in the given order
+def travel_length(strokes, scale=(1.0, 1.0)):
+    if len(strokes) < 2:
+        return 0.0
+    scale = np.asarray(scale, dtype=np.float64)
+    ends = np.array([stroke[-1] for stroke in strokes[:-1]], dtype=np.float64) * scale
+    starts = np.array([stroke[0] for stroke in strokes[1:]], dtype=np.float64) * scale
+    return float(np.hypot(*(starts - ends).T).sum())
+
+# Distance between matching rows of two arrays of points, or 0 where there is no move (before the first/after the last stroke)
+def _distance(from_points, to_points, valid=None):
+    distance = np.hypot(*(to_points - from_points).T)
+    if valid is not None:
+        distance = np.where(valid, distance, 0.0)
+    return distance
+
+# Holds a stroke order with the (scaled) first and last point of each stroke as it will be drawn
+class StrokeTour:
+    def __init__(self, starts, ends, order, flipped):
+        self.starts = starts
+        self.ends = ends
+        self.order = np.asarray(order, dtype=np.intp)
+        self.flipped = np.asarray(flipped, dtype=bool)
+        self.update()
+
+    # Recompute the drawn start/end of every position in the tour
+    def update(self):
+        self.first = np.where(self.flipped[:, None], self.ends[self.order], self.starts[self.order])
+        self.last = np.where(self.flipped[:, None], self.starts[self.order], self.ends[self.order])
+
+    # Length of every move between consecutive strokes
+    def gaps(self):
+        return _distance(self.last[:-1], self.first[1:])
+
+    def length(self):
+        return float(self.gaps().sum())
+
+    # Reverse the strokes at positions start..end (inclusive), which also flips the direction of each one
+    def reverse(self, start, end):
+        self.order[start:end + 1] = self.order[start:end + 1][::-1].copy()
+        self.flipped[start:end + 1] = ~self.flipped[start:end + 1][::-1]
+        self.update()
+
+    # Move the strokes at positions start..end (inclusive) to sit after position "after", optionally reversed
+    def move(self, start, end, after, reverse):
+        segment_order = self.order[start:end + 1]
+        segment_flipped = self.flipped[start:end + 1]
+        if reverse:
+            segment_order = segment_order[::-1]
+            segment_flipped = ~segment_flipped[::-1]
+        rest_order = np.concatenate((self.order[:start], self.order[end + 1:]))
+        rest_flipped = np.concatenate((self.flipped[:start], self.flipped[end + 1:]))
+        # Positions after the removed segment shift back by its length
+        insert_at = after + 1 if after < start else after + 1 - (end - start + 1)
+        self.order = np.concatenate((rest_order[:insert_at], segment_order, rest_order[insert_at:]))
+        self.flipped = np.concatenate((rest_flipped[:insert_at], segment_flipped, rest_flipped[insert_at:]))
+        self.update()
+
+# Build a first tour by always drawing the closest remaining stroke next (from whichever of its ends is closer)
+def nearest_neighbor_tour(starts, ends):
+    count = len(starts)
+    order = [0]
+    flipped = [False]
+    remaining = np.ones(count, dtype=bool)
+    remaining[0] = False
+    current = ends[0]
+    for _ in range(count - 1):
+        to_start = np.where(remaining, _distance(current, starts), np.inf)
+        to_end = np.where(remaining, _distance(current, ends), np.inf)
+        closest_start = int(np.argmin(to_start))
+        closest_end = int(np.argmin(to_end))
+        if to_end[closest_end] < to_start[closest_start]:
+            order.append(closest_end)
+            flipped.append(True)
+            current = starts[closest_end]
+            remaining[closest_end] = False
+        else:
+            order.append(closest_start)
+            flipped.append(False)
+            current = ends[closest_start]
+            remaining[closest_start] = False
+    return StrokeTour(starts, ends, order, flipped)
+
+# Try every segment reversal (2-opt) once, applying the best improving move found for each start position
+def two_opt_pass(tour, deadline):
+    count = len(tour.order)
+    improved = False
+    for i in range(-1, count - 1):
+        if time.perf_counter() > deadline:
+            break
+        # Reversing positions i+1..j replaces the moves i -> i+1 and j -> j+1
+        j = np.arange(i + 1, count)
+        has_next = j + 1 < count
+        next_first = tour.first[np.minimum(j + 1, count - 1)]
+        old_right = _distance(tour.last[j], next_first, has_next)
+        new_right = _distance(tour.first[i + 1], next_first, has_next)
+        if i >= 0:
+            old_left = _distance(tour.last[i], tour.first[i + 1])
+            new_left = _distance(tour.last[i], tour.last[j])
+        else:
+            old_left = 0.0
+            new_left = 0.0
+        delta = new_left + new_right - old_left - old_right
+        best = int(np.argmin(delta))
+        if delta[best] < -IMPROVEMENT_EPSILON:
+            tour.reverse(i + 1, int(j[best]))
+            improved = True
+    return improved
+
+# Try moving every run of 1-3 strokes somewhere else in the tour (Or-opt), in either direction
+def or_opt_pass(tour, deadline, max_segment=3):
+    improved = False
+    for length in range(1, max_segment + 1):
+        start = 0
+        while start + length <= len(tour.order):
+            if time.perf_counter() > deadline:
+                return improved
+            count = len(tour.order)
+            end = start + length - 1
+            # Gain from taking the segment out and joining its neighbours together
+            before, after = start - 1, end + 1
+            removed = 0.0
+            if before >= 0:
+                removed += float(_distance(tour.last[before], tour.first[start]))
+            if after < count:
+                removed += float(_distance(tour.last[end], tour.first[after]))
+            if before >= 0 and after < count:
+                removed -= float(_distance(tour.last[before], tour.first[after]))
+            # Cost of inserting it between positions k and k+1 (k = -1 is the very beginning)
+            k = np.concatenate((np.arange(-1, start - 1), np.arange(after, count)))
+            if len(k) == 0:
+                start += 1
+                continue
+            has_left = k >= 0
+            has_right = k + 1 < count
+            left = tour.last[np.maximum(k, 0)]
+            right = tour.first[np.minimum(k + 1, count - 1)]
+            existing = _distance(left, right, has_left & has_right)
+            forward = _distance(left, tour.first[start], has_left) + _distance(tour.last[end], right, has_right) - existing
+            backward = _distance(left, tour.last[end], has_left) + _distance(tour.first[start], right, has_right) - existing
+            best_forward = int(np.argmin(forward))
+            best_backward = int(np.argmin(backward))
+            if backward[best_backward] < forward[best_forward]:
+                best, added, reverse = best_backward, backward[best_backward], True
+            else:
+                best, added, reverse = best_forward, forward[best_forward], False
+            if added - removed < -IMPROVEMENT_EPSILON:
+                tour.move(start, end, int(k[best]), reverse)
+                improved = True
+            start += 1
+    return improved
+
+# Reorder (and reverse where useful) strokes to minimize the pen-up travel between them
+# Seeds with a nearest-neighbour tour, then improves it with 2-opt and Or-opt until nothing improves or time runs out
+# Returns the reordered strokes and a dict of stats with the travel length before and after
+def order_strokes(strokes, scale=(1.0, 1.0), time_budget=1.0):
+    started = time.perf_counter()
+    deadline = started + time_budget
+    stats = {"strokes": len(strokes), "travel_before": travel_length(strokes, scale), "passes": 0}
+    if len(strokes) < 2:
+        stats["travel_after"] = stats["travel_before"]
+        stats["seconds"] = time.perf_counter() - started
+        return list(strokes), stats
+    scale = np.asarray(scale, dtype=np.float64)
+    starts = np.array([stroke[0] for stroke in strokes], dtype=np.float64) * scale
+    ends = np.array([stroke[-1] for stroke in strokes], dtype=np.float64) * scale
+    tour = nearest_neighbor_tour(starts, ends)
+    # Keep the original order instead if it was already better than the seeded one
+    if stats["travel_before"] < tour.length():
+        tour = StrokeTour(starts, ends, np.arange(len(strokes)), np.zeros(len(strokes), dtype=bool))
+    stats["travel_seeded"] = tour.length()
+    while time.perf_counter() < deadline:
+        stats["passes"] += 1
+        improved = two_opt_pass(tour, deadline)
+        improved = or_opt_pass(tour, deadline) or improved
+        if not improved:
+            break
+    ordered = [strokes[index][::-1] if flipped else strokes[index] for index, flipped in zip(tour.order, tour.flipped)]
+    stats["travel_after"] = tour.length()
+    stats["seconds"] = time.perf_counter() - started
+    return ordered, stats
@@ -0,0 +1,388 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import json, threading # General
+    import cv2 # OpenCV
+    import numpy as np # Numpy
+    from python.solver import SOLVERS, extract_white_pixels # Path solvers
+    from python.tracer import trace_skeleton, flatten_strokes, is_stroke_list # Skeleton tracer
+    from python.ordering import order_strokes, split_strokes # Stroke ordering
+    from python.simplify import SIMPLIFY_METHODS, simplify_strokes # Stroke simplification
+    from python.gcode import iter_gcode # Gcode writer
+    from python.cache import hash_image, pack_strokes, unpack_strokes # Result cache
+    from python.profiler import StageProfiler # Stage timings
+    from python.thinning import THINNING_BACKENDS # Thinning backends
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# The image -> gcode conversion as plain functions, with no file, console or GPIO access
+# Every stage takes its inputs as arguments and returns a new value, so it is safe to call from any thread or process
+# and to run several conversions side by side (AutoClass, batch mode and the WebUI all build on these)
+
+# Default value of every option used by the conversion (the same defaults as main.py, except that images are only cropped when camera_bounds is given)
+DEFAULT_OPTIONS = {
+    "maximum_x": 613,
+    "maximum_y": 548,
+    "border_x": 50,
+    "border_y": 50,
+    "initial_speed": 50000,
+    "acceleration": 1000,
+    "dwell_time": 10000,
+    "debug": False,
+    "camera_bounds": "(0,0)(0,0)",
+    "solver": "grid",
+    "optimize_travel": True,
+    "travel_time_budget": 1.0,
+    "simplify": "rdp",
+    "simplify_tolerance": 0.5,
+    "resolution": 1000,
+    "mm_per_pixel": 0.0,
+    "auto_crop": True,
+    "solver_workers": 0,
+    "thinning": "zhangsuen",
+}
+
+# Raised when an image or its options can't be converted, instead of quitting the program
+class PipelineError(Exception):
+    pass
+
+# Convert an option given as text (e.g. "false" from the command line or a form) to a bool
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    return bool(value)
+
+# Type of each option, used to convert values passed in as strings
+OPTION_TYPES = {
+    "maximum_x": int,
+    "maximum_y": int,
+    "border_x": int,
+    "border_y": int,
+    "initial_speed": int,
+    "acceleration": int,
+    "dwell_time": int,
+    "debug": _to_bool,
+    "camera_bounds": str,
+    "solver": str,
+    "optimize_travel": _to_bool,
+    "travel_time_budget": float,
+    "simplify": str,
+    "simplify_tolerance": float,
+    "resolution": int,
+    "mm_per_pixel": float,
+    "auto_crop": _to_bool,
+    "solver_workers": int,
+    "thinning": str,
+}
+
+# Blank pixels kept around the ink by the auto-crop (thinning and the distance transform look at each pixel's neighbours)
+ROI_PADDING = 4
+
+# Largest working canvas side allowed, in pixels (a 0.01mm mm_per_pixel would otherwise ask for a gigapixel skeleton)
+MAX_RESOLUTION = 8000
+
+# Merge the given options over DEFAULT_OPTIONS, converting and checking each value
+# Options that the conversion doesn't use (e.g. "webui") are ignored
+def resolve_options(opts_dict=None):
+    options = dict(DEFAULT_OPTIONS)
+    for key, value in (opts_dict or {}).items():
+        if key not in OPTION_TYPES:
+            continue
+        try:
+            options[key] = OPTION_TYPES[key](value)
+        except (TypeError, ValueError):
+            raise PipelineError(f"Invalid value for \"{key}\": {value!r}")
+    if options["solver"] != "trace" and options["solver"] not in SOLVERS:
+        raise PipelineError(f"Unknown solver \"{options['solver']}\". Available solvers: trace, {', '.join(SOLVERS)}")
+    if options["thinning"] not in THINNING_BACKENDS:
+        raise PipelineError(f"Unknown thinning backend \"{options['thinning']}\". Available backends: {', '.join(THINNING_BACKENDS)}")
+    if options["simplify"] != "none" and options["simplify"] not in SIMPLIFY_METHODS:
+        raise PipelineError(f"Unknown simplify method \"{options['simplify']}\". Available methods: none, {', '.join(SIMPLIFY_METHODS)}")
+    parse_camera_bounds(options["camera_bounds"])
+    get_resolution(options)
+    return options
+
+# Convert camera bounds in the format of "(0,0)(0,0)" to [[0,0],[0,0]]
+def parse_camera_bounds(camera_bounds):
+    try:
+        temp_bounds = str(camera_bounds).replace(")(",",").replace("(","").replace(")","").split(",")
+        return [[int(temp_bounds[0]), int(temp_bounds[1])], [int(temp_bounds[2]), int(temp_bounds[3])]]
+    except (IndexError, ValueError):
+        raise PipelineError(f"Invalid camera bounds \"{camera_bounds}\". Use the format \"(x1,y1)(x2,y2)\"")
+
+# Get an image array from either an image array or the bytes of an encoded image file (e.g. an upload)
+def decode_image(image):
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if decoded is None:
+            raise PipelineError("Could not decode the image data")
+        return decoded
+    if isinstance(image, np.ndarray):
+        if image.size == 0 or image.ndim not in (2, 3):
+            raise PipelineError(f"Expected a 2D or 3D image array, got shape {image.shape}")
+        return image
+    raise PipelineError(f"Expected image bytes or an image array, got {type(image).__name__}")
+
+# Rotate image 180 degrees
+def rotate_image(image):
+    return cv2.rotate(image, cv2.ROTATE_180)
+
+# Crop image to the camera bounds ([[x1, y1], [x2, y2]]), leaving it alone if the bounds are all 0
+def crop_image(image, camera_bounds):
+    if camera_bounds == [[0, 0], [0, 0]]:
+        return image
+    return image[camera_bounds[0][1]:camera_bounds[1][1], camera_bounds[0][0]:camera_bounds[1][0]]
+
+# Convert image to grayscale
+def grayscale_image(image):
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+# Convert image to black and white
+def invert_image(image):
+    return cv2.bitwise_not(image)
+
+# Threshold image
+def threshold_image(image):
+    return cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)[1]
+
+# Convert image to fixed size
+def resize_image(image, width=1000, height=1000):
+    return cv2.resize(image, (width, height))
+
+# Get the bounding box (x, y, width, height) of the ink in a thresholded image, grown by "padding" blank pixels on each side
+# Returns None if the image has no ink at all
+def find_roi(image, padding=ROI_PADDING):
+    x, y, width, height = cv2.boundingRect(image)
+    if width == 0 or height == 0:
+        return None
+    x1, y1 = max(0, x - padding), max(0, y - padding)
+    x2, y2 = min(image.shape[1], x + width + padding), min(image.shape[0], y + height + padding)
+    return (x1, y1, x2 - x1, y2 - y1)
+
+# Run an image stage on just the region of interest (x, y, width, height) of an image, and paste its result into a
+# blank image the size of the original, so pixel coords (and the gcode made from them) stay the same
+# The padding around the ink is blank, so the result is the same as running the stage on the whole image
+# Extra arrays the size of the image (e.g. its distance map) are cropped the same way and passed to the stage after it
+def apply_in_roi(stage, image, roi, *extras):
+    if roi is None or (roi[2], roi[3]) == (image.shape[1], image.shape[0]):
+        return stage(image, *extras)
+    x, y, width, height = roi
+    result = stage(image[y:y + height, x:x + width], *(extra[y:y + height, x:x + width] for extra in extras))
+    full = np.zeros(image.shape[:2] + result.shape[2:], result.dtype)
+    full[y:y + height, x:x + width] = result
+    return full
+
+# Apply Euclidean Distance Transform to get distance map
+def get_distance_map(image):
+    return cv2.distanceTransform(image, cv2.DIST_L2, 5)
+
+# Normalize distance map into a new array
+def normalize_distance_map(distance_map):
+    return cv2.normalize(distance_map, None, 0, 255, cv2.NORM_MINMAX)
+
+# Use the selected thinning backend to get skeleton of the image, as a single channel image (white skeleton on black)
+# The distance map of the image is only used by the ridge backend, which works it out itself if it isn't given
+def get_skeleton(image, distance_map=None, thinning="zhangsuen"):
+    if thinning not in THINNING_BACKENDS:
+        raise PipelineError(f"Unknown thinning backend \"{thinning}\". Available backends: {', '.join(THINNING_BACKENDS)}")
+    return THINNING_BACKENDS[thinning](image, distance_map)
+
+# Destination buffers reused by preprocess_image from one image to the next, one set per thread so that
+# concurrent conversions never write into the same buffer
+_buffers = threading.local()
+
+# Get this thread's reusable buffer called "name", allocating a new one only when the shape changes
+def _get_buffer(name, shape):
+    buffer = getattr(_buffers, name, None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, np.uint8)
+        setattr(_buffers, name, buffer)
+    return buffer
+
+# Get a grayscale image from the bytes of an encoded image file (decoded straight to one channel), or an image array
+def decode_grayscale(image):
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if decoded is None:
+            raise PipelineError("Could not decode the image data")
+        return decoded
+    return decode_image(image)
+
+# Crop the image to the camera bounds as they would fall after rotating it 180 degrees, so it can be cropped first
+# Returns a view, so nothing is copied
+def crop_unrotated_image(image, camera_bounds):
+    if camera_bounds == [[0, 0], [0, 0]]:
+        return image
+    height, width = image.shape[:2]
+    # The rows and columns the bounds select in the rotated image, mirrored back onto the image as it is
+    rows = range(height)[camera_bounds[0][1]:camera_bounds[1][1]]
+    columns = range(width)[camera_bounds[0][0]:camera_bounds[1][0]]
+    if len(rows) == 0 or len(columns) == 0:
+        return image[0:0, 0:0]
+    return image[height - 1 - rows[-1]:height - rows[0], width - 1 - columns[-1]:width - columns[0]]
+
+# Run every image stage from the raw image to the thresholded, resized image that gets thinned, as one fused stage
+# Same result as rotate, crop, grayscale, invert, threshold and resize one after another, but with fewer full-frame passes:
+# files are decoded straight to grayscale, the crop happens first (as a view, before rotating), invert and threshold are one
+# inverse threshold, and the in-between images are written into reused buffers. Only the resized image is a new array
+# (libpng and libjpeg convert to grayscale themselves, so a few pixels can be 1 level off from converting a decoded color image)
+# "resolution" is the (width, height) of the working canvas, see get_resolution
+def preprocess_image(image, camera_bounds, resolution=(1000, 1000)):
+    image = crop_unrotated_image(decode_grayscale(image), camera_bounds)
+    if image.size == 0:
+        raise PipelineError("The camera bounds crop away the whole image")
+    shape = image.shape[:2]
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY, dst=_get_buffer("gray", shape))
+    # Inverting and then keeping what is above 127 is the same as keeping what is 127 or below
+    binary = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY_INV, dst=_get_buffer("binary", shape))[1]
+    rotated = cv2.rotate(binary, cv2.ROTATE_180, dst=_get_buffer("rotated", shape))
+    return cv2.resize(rotated, (resolution[0], resolution[1]))
+
+# Turn the skeleton into drawable points with the selected solver
+# Returns an (n, 2) array of ordered points, or a list of strokes for solver=trace
+def solve_skeleton(skeleton, solver="grid", progress=None, workers=0):
+    if solver == "trace":
+        return trace_skeleton(skeleton, progress=progress)
+    if solver not in SOLVERS:
+        raise PipelineError(f"Unknown solver \"{solver}\". Available solvers: trace, {', '.join(SOLVERS)}")
+    return SOLVERS[solver](extract_white_pixels(skeleton), progress=progress, workers=workers)
+
+# Get the (width, height) in pixels of the working canvas that the image is resized to before it is thinned
+# With mm_per_pixel, it follows the drawing area (the machine size minus the borders), keeping its aspect ratio
+# Otherwise it is a square "resolution" pixels wide, so fewer pixels trade detail for speed
+def get_resolution(options):
+    if options.get("mm_per_pixel", 0) > 0:
+        width = round((options["maximum_x"]-(2*options["border_x"])) / options["mm_per_pixel"])
+        height = round((options["maximum_y"]-(2*options["border_y"])) / options["mm_per_pixel"])
+    else:
+        width = height = options.get("resolution", 1000)
+    if width < 1 or height < 1 or max(width, height) > MAX_RESOLUTION:
+        raise PipelineError(f"Invalid working resolution {width}x{height}, each side must be between 1 and {MAX_RESOLUTION} pixels")
+    return (width, height)
+
+# Get the size of one pixel in printer units (mm), as (x, y)
+def get_scale(options):
+    width, height = get_resolution(options)
+    return ((options["maximum_x"]-(2*options["border_x"]))/width, (options["maximum_y"]-(2*options["border_y"]))/height)
+
+# The outcome of one conversion: the final strokes, the options used, and stats from each stage
+class PipelineResult:
+    def __init__(self, strokes, options, stats):
+        self.strokes = strokes
+        self.options = options
+        self.stats = stats
+
+    # All points of all strokes as one (n, 2) array, in drawing order
+    @property
+    def points(self):
+        return flatten_strokes(self.strokes)
+
+    # Number of moves in the gcode (one per point)
+    @property
+    def moves(self):
+        return sum(len(stroke) for stroke in self.strokes)
+
+    # Stream the gcode in chunks of lines
+    def iter_gcode(self):
+        options = self.options
+        return iter_gcode(self.strokes, options["maximum_x"], options["maximum_y"], options["border_x"], options["border_y"], options["initial_speed"], options["acceleration"], options["dwell_time"], options["debug"], resolution=get_resolution(options))
+
+    # The whole gcode program as one string
+    @property
+    def gcode(self):
+        return "".join(self.iter_gcode())
+
+# Convert an image (an image array, or the bytes of an image file) into strokes ready to be written as gcode
+# Options not given fall back to DEFAULT_OPTIONS, and progress is reported to an optional ProgressReporter
+# With a ResultCache, the skeleton, solved strokes and final strokes are reused from earlier conversions of the same image
+# The seconds spent in each stage are kept in stats["timings"], and the furthest stage found in the cache in stats["cache"]
+# Pass a StageProfiler to also record the CPU time and memory of each stage, and counts like the number of white pixels
+# Raises PipelineError if the image or options can't be used
+def convert(image, opts_dict=None, progress=None, cache=None, profiler=None):
+    options = resolve_options(opts_dict)
+    # Time each stage (and, if the caller's profiler tracks it, its memory)
+    if profiler is None:
+        profiler = StageProfiler()
+    profiler.start()
+    lap = profiler.lap
+    stats = {"cache": "none" if cache is None else "miss", "thinning": options["thinning"]}
+    skeleton = None
+    strokes = None
+    if cache is not None:
+        # Each key covers the image and the options of its own stage and every stage before it
+        # (the gcode-only options, like speed and dwell, aren't part of any key)
+        skeleton_key = cache.key("skeleton", hash_image(image), options["camera_bounds"], get_resolution(options), options["thinning"])
+        solved_key = cache.key("solved", skeleton_key, options["solver"])
+        strokes_key = cache.key("strokes", solved_key, options["optimize_travel"], options["travel_time_budget"], options["simplify"], options["simplify_tolerance"], get_scale(options))
+        # Start from the furthest stage that is cached
+        cached = cache.load(strokes_key, "points", "lengths", "stats")
+        if cached is not None:
+            stats = json.loads(str(cached["stats"]))
+            stats["cache"] = "strokes"
+            strokes = unpack_strokes(cached["points"], cached["lengths"])
+            lap("cache")
+            return finish_conversion(strokes, options, stats, profiler)
+        cached = cache.load(solved_key, "points", "lengths")
+        if cached is not None:
+            stats["cache"] = "solved"
+            strokes = unpack_strokes(cached["points"], cached["lengths"])
+        else:
+            cached = cache.load(skeleton_key, "skeleton")
+            if cached is not None:
+                stats["cache"] = "skeleton"
+                skeleton = cached["skeleton"]
+        lap("cache")
+    if strokes is None:
+        if skeleton is None:
+            image = preprocess_image(image, parse_camera_bounds(options["camera_bounds"]), get_resolution(options))
+            lap("preprocess")
+            # Only thin the part of the canvas that has ink on it
+            skeleton = apply_in_roi(lambda crop: get_skeleton(crop, thinning=options["thinning"]), image, find_roi(image) if options["auto_crop"] else None)
+            lap("skeleton")
+            if cache is not None:
+                cache.save(skeleton_key, skeleton=skeleton)
+                lap("cache")
+        solved = solve_skeleton(skeleton, options["solver"], progress, options["solver_workers"])
+        strokes = solved if is_stroke_list(solved) else split_strokes(solved)
+        lap("solve")
+        if cache is not None and len(strokes) > 0:
+            points, lengths = pack_strokes(strokes)
+            cache.save(solved_key, points=points, lengths=lengths)
+            lap("cache")
+    stats["strokes"] = len(strokes)
+    stats["points"] = sum(len(stroke) for stroke in strokes)
+    if stats["points"] == 0:
+        raise PipelineError("No white pixels found in image")
+    if options["optimize_travel"] and len(strokes) > 1:
+        strokes, ordering_stats = order_strokes(strokes, time_budget=options["travel_time_budget"])
+        stats["ordering"] = ordering_stats
+        lap("order")
+    if options["simplify"] != "none":
+        strokes, simplify_stats = simplify_strokes(strokes, method=options["simplify"], tolerance=options["simplify_tolerance"], scale=get_scale(options))
+        stats["simplify"] = simplify_stats
+        lap("simplify")
+    if cache is not None:
+        points, lengths = pack_strokes(strokes)
+        cache.save(strokes_key, points=points, lengths=lengths, stats=np.array(json.dumps(stats)))
+        lap("cache")
+    return finish_conversion(strokes, options, stats, profiler)
+
+# Add the timings and counts of a conversion to its stats, and wrap it up as a PipelineResult
+def finish_conversion(strokes, options, stats, profiler):
+    profiler.count("white_pixels", stats["points"])
+    profiler.count("strokes", len(strokes))
+    profiler.count("points", sum(len(stroke) for stroke in strokes))
+    stats["timings"] = profiler.timings()
+    return PipelineResult(strokes, options, stats)
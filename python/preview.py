@@ -0,0 +1,75 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import threading # General
+    from collections import OrderedDict # LRU cache
+    import cv2 # OpenCV
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Longest side of a preview image, in pixels (the size the WebUI displays them at)
+PREVIEW_SIZE = 512
+
+# JPEG quality of preview images
+PREVIEW_QUALITY = 85
+
+# Shrink an image to the size it is previewed at, as a new 8-bit array that doesn't share memory with the original
+# Float images (e.g. the distance map) are saturated to 0-255, the same as cv2.imwrite does
+def shrink_preview(image, size=PREVIEW_SIZE):
+    if image.dtype != "uint8":
+        image = cv2.convertScaleAbs(image)
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    return image.copy()
+
+# Encode an image as a small JPEG for display in the browser
+def encode_preview(image, size=PREVIEW_SIZE, quality=PREVIEW_QUALITY):
+    image = shrink_preview(image, size)
+    success, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("Could not encode the preview image")
+    return data.tobytes()
+
+# In-memory least-recently-used cache of encoded previews, limited to a total number of bytes
+class PreviewCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Get the preview stored under "key", or None if it isn't cached
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    # Store a preview under "key", dropping the least recently used ones to stay under max_bytes
+    def put(self, key, data):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, oldest = self.entries.popitem(last=False)
+                self.size -= len(oldest)
+
+    # Get the preview stored under "key", encoding "image" and caching it first if needed
+    def get_or_encode(self, key, image):
+        data = self.get(key)
+        if data is None:
+            data = encode_preview(image)
+            self.put(key, data)
+        return data
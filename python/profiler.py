@@ -0,0 +1,203 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, time, json, functools, threading, tracemalloc # General
+    from collections import deque # Recent reports
+    from contextlib import contextmanager # Stage context manager
+    from rich.table import Table # Summary table
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# The resource module only exists on Unix, so peak RSS is left out of reports elsewhere
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Get the peak resident memory of this process so far, in MB (or None if it can't be measured here)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+# Number of profilers using tracemalloc, so it keeps running until the last one is closed (e.g. with several WebUI jobs)
+tracing_users = 0
+tracing_lock = threading.Lock()
+tracing_started = False
+
+# Start tracemalloc for one more profiler (unless something else, like PYTHONTRACEMALLOC, already started it)
+def start_tracing():
+    global tracing_users, tracing_started
+    with tracing_lock:
+        if tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing_started = True
+        tracing_users += 1
+
+# Stop tracemalloc once no profiler is using it anymore (only if it was started by start_tracing)
+def stop_tracing():
+    global tracing_users, tracing_started
+    with tracing_lock:
+        tracing_users -= 1
+        if tracing_users == 0 and tracing_started:
+            tracemalloc.stop()
+            tracing_started = False
+
+# Records the wall time, CPU time and memory of each stage of one conversion, plus counts like white pixels or gcode lines
+# Memory is measured with tracemalloc when track_memory is set, which slows Python code down, so only turn it on when profiling
+# tracemalloc covers the whole process, so memory used by other threads at the same time is counted too
+class StageProfiler:
+    def __init__(self, name="", track_memory=False):
+        self.name = name
+        self.track_memory = track_memory
+        self.stages = []
+        self.counts = {}
+        self.created = time.time()
+        self.tracing = False
+        self.started = None
+
+    # Start timing a stage, returning the starting point (also kept for lap)
+    def start(self):
+        if self.track_memory and not self.tracing:
+            start_tracing()
+            self.tracing = True
+        memory_before = 0
+        if self.track_memory:
+            memory_before = tracemalloc.get_traced_memory()[0]
+            # Python 3.8 can't reset the peak, so the peak may come from an earlier stage there
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        self.started = (time.perf_counter(), time.process_time(), memory_before)
+        return self.started
+
+    # Record the stage that began at "started" (or the last start) as "name"
+    def stop(self, name, started=None):
+        wall_started, cpu_started, memory_before = started or self.started
+        record = {
+            "stage": name,
+            "wall_seconds": time.perf_counter() - wall_started,
+            "cpu_seconds": time.process_time() - cpu_started,
+        }
+        if self.track_memory:
+            memory_after, memory_peak = tracemalloc.get_traced_memory()
+            record["memory_mb"] = (memory_after - memory_before) / (1024 * 1024)
+            record["peak_memory_mb"] = max(0, memory_peak - memory_before) / (1024 * 1024)
+        self.stages.append(record)
+
+    # Record the stage that just finished as "name" and start timing the next one, for code that runs stages back to back
+    def lap(self, name):
+        self.stop(name)
+        self.start()
+
+    # Time the code inside a "with profiler.stage(name):" block as one stage
+    @contextmanager
+    def stage(self, name):
+        started = self.start()
+        try:
+            yield
+        finally:
+            self.stop(name, started)
+
+    # Record a count (e.g. the number of white pixels)
+    def count(self, name, value):
+        self.counts[name] = int(value)
+
+    # Pass gcode chunks through, counting their lines into "name" once they have all been written
+    def count_lines(self, name, chunks):
+        lines = 0
+        for chunk in chunks:
+            lines += chunk.count("\n")
+            yield chunk
+        self.count(name, lines)
+
+    # Get the seconds spent in each stage, adding up stages that ran more than once
+    def timings(self):
+        timings = {}
+        for record in self.stages:
+            timings[record["stage"]] = timings.get(record["stage"], 0.0) + record["wall_seconds"]
+        return timings
+
+    # Get the whole report as a dict that can be saved as JSON
+    def report(self):
+        return {
+            "name": self.name,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created)),
+            "wall_seconds": sum(record["wall_seconds"] for record in self.stages),
+            "cpu_seconds": sum(record["cpu_seconds"] for record in self.stages),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": list(self.stages),
+            "counts": dict(self.counts),
+        }
+
+    # Save the report as a JSON file
+    def write_report(self, filename):
+        save_report(self.report(), filename)
+
+    # Let go of tracemalloc (it is stopped once no other profiler is using it)
+    def close(self):
+        if self.tracing:
+            stop_tracing()
+            self.tracing = False
+
+# Save a report as a JSON file
+def save_report(report, filename):
+    with open(filename, "w") as f:
+        json.dump(report, f, indent=4)
+
+# Build a Rich table of the stages in a report
+def report_table(report):
+    table = Table(title=f"Profile {report['name']}".strip())
+    table.add_column("Stage")
+    table.add_column("Wall (s)", justify="right")
+    table.add_column("CPU (s)", justify="right")
+    table.add_column("Peak memory (MB)", justify="right")
+    for record in report["stages"]:
+        peak = f"{record['peak_memory_mb']:.1f}" if "peak_memory_mb" in record else "-"
+        table.add_row(record["stage"], f"{record['wall_seconds']:.3f}", f"{record['cpu_seconds']:.3f}", peak)
+    table.add_row("[bold]Total[/bold]", f"{report['wall_seconds']:.3f}", f"{report['cpu_seconds']:.3f}", "-" if report["peak_rss_mb"] is None else f"{report['peak_rss_mb']:.1f} (RSS)")
+    return table
+
+# Decorator for AutoClass methods, timing each call as a stage whenever the object has a profiler
+def profiled(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return method(self, *args, **kwargs)
+        with self.profiler.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+# Keeps the most recent reports and sums them up per stage (for the WebUI metrics endpoint)
+class MetricsCollector:
+    def __init__(self, max_reports=100):
+        self.reports = deque(maxlen=max_reports)
+        self.lock = threading.Lock()
+
+    # Add a finished report
+    def add(self, report):
+        with self.lock:
+            self.reports.append(report)
+
+    # Get the count, mean and max wall time of each stage over the recent reports, plus the reports themselves
+    def summary(self):
+        with self.lock:
+            reports = list(self.reports)
+        stages = {}
+        for report in reports:
+            for record in report["stages"]:
+                stage = stages.setdefault(record["stage"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                stage["count"] += 1
+                stage["total_seconds"] += record["wall_seconds"]
+                stage["max_seconds"] = max(stage["max_seconds"], record["wall_seconds"])
+        for stage in stages.values():
+            stage["mean_seconds"] = stage["total_seconds"] / stage["count"]
+        return {"reports": len(reports), "peak_rss_mb": peak_rss_mb(), "stages": stages, "recent": reports}
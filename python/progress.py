@@ -0,0 +1,106 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import time, threading # General
+    from rich.progress import Progress # Progress bar
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Tracks the progress of long-running stages (like solving) and passes it on to any registered callbacks
+# Loops only check a counter against the next checkpoint, so reporting costs the same no matter how big the job is
+class ProgressReporter:
+    def __init__(self, checkpoints=100, min_interval=0.1):
+        # Number of checkpoints per stage, and the minimum number of seconds between callbacks
+        self.checkpoints = checkpoints
+        self.min_interval = min_interval
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.stride = 1
+        self.finished = True
+        self.last_report = 0.0
+
+    # Register a function to be called with a snapshot dict whenever progress is reported
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # Begin a new stage with "total" steps, returning the step at which update() should next be called
+    def start(self, stage, total):
+        with self.lock:
+            self.stage = stage
+            self.total = total
+            self.done = 0
+            self.stride = max(1, total // self.checkpoints)
+            self.finished = False
+        self._report(force=True)
+        return self.stride
+
+    # Record that "done" steps are complete, returning the step at which update() should next be called
+    def update(self, done):
+        self.done = done
+        if time.monotonic() - self.last_report >= self.min_interval:
+            self._report()
+        return done + self.stride
+
+    # Mark the current stage as complete
+    def finish(self):
+        with self.lock:
+            self.done = self.total
+            self.finished = True
+        self._report(force=True)
+
+    # Get the current progress as a dict (e.g. to send to the browser)
+    def snapshot(self):
+        with self.lock:
+            return {
+                "stage": self.stage,
+                "done": self.done,
+                "total": self.total,
+                "fraction": self.done / self.total if self.total > 0 else (1.0 if self.finished else 0.0),
+                "finished": self.finished,
+            }
+
+    def _report(self, force=False):
+        if not self.callbacks:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_report < self.min_interval:
+            return
+        self.last_report = now
+        snapshot = self.snapshot()
+        for callback in self.callbacks:
+            callback(snapshot)
+
+# Progress callback that renders each stage as a Rich progress bar in the console
+class RichProgressBar:
+    def __init__(self):
+        self.progress = None
+        self.task = None
+        self.stage = None
+
+    def __call__(self, snapshot):
+        if self.progress is None or snapshot["stage"] != self.stage:
+            self.close()
+            self.progress = Progress()
+            self.progress.start()
+            self.task = self.progress.add_task(f"[hot_pink3]{snapshot['stage']}[/hot_pink3]", total=max(snapshot["total"], 1))
+            self.stage = snapshot["stage"]
+        self.progress.update(self.task, completed=snapshot["done"])
+        if snapshot["finished"]:
+            self.close()
+
+    # Stop drawing the current progress bar
+    def close(self):
+        if self.progress is not None:
+            self.progress.stop()
+            self.progress = None
+            self.stage = None
@@ -0,0 +1,86 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Remove repeated points and any point sitting in the middle of a straight run (lossless)
+def merge_collinear(stroke):
+    stroke = np.asarray(stroke).reshape(-1, 2)
+    if len(stroke) < 2:
+        return stroke
+    # Drop points that repeat the previous one
+    moved = np.any(np.diff(stroke, axis=0) != 0, axis=1)
+    if not moved.all():
+        stroke = stroke[np.concatenate(([True], moved))]
+    if len(stroke) < 3:
+        return stroke
+    # A point is redundant when the steps into and out of it point in the same direction
+    steps = np.diff(stroke, axis=0)
+    cross = steps[:-1, 0] * steps[1:, 1] - steps[:-1, 1] * steps[1:, 0]
+    dot = steps[:-1, 0] * steps[1:, 0] + steps[:-1, 1] * steps[1:, 1]
+    keep = np.concatenate(([True], ~((cross == 0) & (dot > 0)), [True]))
+    return stroke[keep]
+
+# Ramer-Douglas-Peucker simplification, keeping every point that is more than "tolerance" away from the simplified line
+# Distances are measured after multiplying the points by "scale", so the tolerance can be given in printer units (mm)
+def simplify_rdp(stroke, tolerance, scale=(1.0, 1.0)):
+    stroke = merge_collinear(stroke)
+    if len(stroke) < 3:
+        return stroke
+    points = stroke.astype(np.float64) * np.asarray(scale, dtype=np.float64)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    # Use a stack instead of recursion so long strokes can't hit the recursion limit
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        direction = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*direction)
+        if length == 0:
+            # Closed loop, so measure the distance from the shared start/end point instead
+            distances = np.hypot(*offsets.T)
+        else:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return stroke[keep]
+
+# Collinear merging only, which never moves the drawn line (the tolerance is ignored)
+def simplify_collinear(stroke, tolerance=0.0, scale=(1.0, 1.0)):
+    return merge_collinear(stroke)
+
+# Available simplification methods, selected with the "simplify" option
+SIMPLIFY_METHODS = {
+    "rdp": simplify_rdp,
+    "collinear": simplify_collinear,
+}
+
+# Simplify every stroke with the given method
+# Returns the simplified strokes and a dict of stats with the number of points before and after
+def simplify_strokes(strokes, method="rdp", tolerance=0.5, scale=(1.0, 1.0)):
+    simplify = SIMPLIFY_METHODS[method]
+    simplified = [simplify(stroke, tolerance, scale) for stroke in strokes]
+    points_before = sum(len(stroke) for stroke in strokes)
+    points_after = sum(len(stroke) for stroke in simplified)
+    stats = {
+        "points_before": points_before,
+        "points_after": points_after,
+        "ratio": points_before / points_after if points_after > 0 else 1.0,
+    }
+    return simplified, stats
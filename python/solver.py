@@ -0,0 +1,326 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import os, math, atexit, threading # General
+    import multiprocessing # Process pool context
+    from concurrent.futures import ProcessPoolExecutor, as_completed # Process pool
+    import cv2 # OpenCV
+    import numpy as np # Numpy
+    from python.ordering import nearest_neighbor_tour # Stitching components together
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Offsets of the 4 orthogonal and 4 diagonal neighbours of a pixel
+ORTHOGONAL_OFFSETS = ((0, -1), (-1, 0), (1, 0), (0, 1))
+DIAGONAL_OFFSETS = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+
+# Spatial index over integer pixel coords, bucketed into square cells so that lookups only touch nearby cells
+# Points can be removed from the index once they have been visited
+class GridIndex:
+    def __init__(self, points, cell_size=16):
+        self.points = points
+        self.cell_size = cell_size
+        # Map of (x, y) -> index for every point still in the index
+        self.lookup = {}
+        # Map of (cell_x, cell_y) -> set of indices for every non-empty cell
+        self.cells = {}
+        for index, (x, y) in enumerate(points):
+            self.lookup[(x, y)] = index
+            cell = (x // cell_size, y // cell_size)
+            if cell in self.cells:
+                self.cells[cell].add(index)
+            else:
+                self.cells[cell] = {index}
+
+    def __len__(self):
+        return len(self.lookup)
+
+    # Remove a point from the index
+    def remove(self, index):
+        x, y = self.points[index]
+        del self.lookup[(x, y)]
+        cell = (x // self.cell_size, y // self.cell_size)
+        bucket = self.cells[cell]
+        bucket.discard(index)
+        if not bucket:
+            del self.cells[cell]
+
+    # Count how many of the 8 surrounding pixels are still in the index
+    def count_neighbors(self, index):
+        x, y = self.points[index]
+        neighbors = 0
+        for dx, dy in ORTHOGONAL_OFFSETS + DIAGONAL_OFFSETS:
+            if (x + dx, y + dy) in self.lookup:
+                neighbors += 1
+        return neighbors
+
+    # Find the closest remaining point to (x, y), breaking ties by the lowest index (same as a linear scan would)
+    def nearest(self, x, y):
+        # Fast path: a direct neighbour is always the closest possible point (distance 1, then sqrt(2))
+        for offsets in (ORTHOGONAL_OFFSETS, DIAGONAL_OFFSETS):
+            best_index = None
+            for dx, dy in offsets:
+                index = self.lookup.get((x + dx, y + dy))
+                if index is not None and (best_index is None or index < best_index):
+                    best_index = index
+            if best_index is not None:
+                return best_index
+        if not self.lookup:
+            return None
+        # Search outwards in square rings of cells around the cell containing (x, y)
+        cell_size = self.cell_size
+        cell_x, cell_y = x // cell_size, y // cell_size
+        best_index = None
+        best_distance = None
+        ring = 0
+        while True:
+            # Any point in this ring is at least this far away along one axis, so stop once we can't do better
+            lower_bound = ((ring - 1) * cell_size + 1) ** 2 if ring > 0 else 0
+            if best_distance is not None and lower_bound > best_distance:
+                return best_index
+            # Once the ring is larger than the number of occupied cells, scan those cells directly instead
+            if 8 * ring > len(self.cells):
+                return self._nearest_scan(x, y, best_index, best_distance)
+            for cell in self._ring_cells(cell_x, cell_y, ring):
+                bucket = self.cells.get(cell)
+                if bucket is None:
+                    continue
+                for index in bucket:
+                    px, py = self.points[index]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if best_distance is None or distance < best_distance or (distance == best_distance and index < best_index):
+                        best_distance = distance
+                        best_index = index
+            ring += 1
+
+    # Yield every cell on the square ring at Chebyshev distance "ring" from (cell_x, cell_y)
+    def _ring_cells(self, cell_x, cell_y, ring):
+        if ring == 0:
+            yield (cell_x, cell_y)
+            return
+        for offset in range(-ring, ring + 1):
+            yield (cell_x + offset, cell_y - ring)
+            yield (cell_x + offset, cell_y + ring)
+        for offset in range(-ring + 1, ring):
+            yield (cell_x - ring, cell_y + offset)
+            yield (cell_x + ring, cell_y + offset)
+
+    # Scan all occupied cells, skipping any that can't contain a closer point than the best found so far
+    def _nearest_scan(self, x, y, best_index=None, best_distance=None):
+        cell_size = self.cell_size
+        for (cell_x, cell_y), bucket in self.cells.items():
+            dx = max(cell_x * cell_size - x, 0, x - (cell_x * cell_size + cell_size - 1))
+            dy = max(cell_y * cell_size - y, 0, y - (cell_y * cell_size + cell_size - 1))
+            if best_distance is not None and dx * dx + dy * dy > best_distance:
+                continue
+            for index in bucket:
+                px, py = self.points[index]
+                distance = (px - x) ** 2 + (py - y) ** 2
+                if best_distance is None or distance < best_distance or (distance == best_distance and index < best_index):
+                    best_distance = distance
+                    best_index = index
+        return best_index
+
+# Gather the coords of all white pixels in the skeleton as an (n, 2) int32 array of [x, y], in row-major order
+def extract_white_pixels(skeleton):
+    if skeleton.ndim == 3:
+        skeleton = skeleton[:, :, 0]
+    return np.argwhere(skeleton == 255)[:, ::-1].astype(np.int32)
+
+# Order white pixels with a greedy nearest-neighbour walk backed by a GridIndex
+# Produces the same ordering as the original all-pairs method, in roughly O(n log n) instead of O(n^2)
+# Progress is reported to an optional ProgressReporter at coarse checkpoints
+# Every solver takes "workers" so they can be called the same way, but only solve_components uses more than one
+def solve_grid(white_pixels, progress=None, workers=1):
+    white_pixels = np.asarray(white_pixels, dtype=np.int32).reshape(-1, 2)
+    if len(white_pixels) == 0:
+        return white_pixels
+    # The index works on plain ints, which are much faster to hash and compare than numpy scalars
+    points = white_pixels.tolist()
+    index = GridIndex(points)
+    # Start from the first pixel with the fewest neighbours (an endpoint of a line, if there is one)
+    start_index = 0
+    least_neighbors = 2
+    for i in range(0, len(points)):
+        neighbors = index.count_neighbors(i)
+        if neighbors < least_neighbors:
+            least_neighbors = neighbors
+            start_index = i
+            if least_neighbors == 0:
+                break
+    # Walk to the closest unvisited pixel until none are left
+    order = [start_index]
+    index.remove(start_index)
+    current_x, current_y = points[start_index]
+    next_report = progress.start("Solving white pixels", len(points)) if progress is not None else len(points) + 1
+    while len(index) > 0:
+        closest_index = index.nearest(current_x, current_y)
+        index.remove(closest_index)
+        order.append(closest_index)
+        current_x, current_y = points[closest_index]
+        if len(order) >= next_report:
+            next_report = progress.update(len(order))
+    if progress is not None:
+        progress.finish()
+    return white_pixels[np.array(order, dtype=np.intp)]
+
+# Original O(n^2) solver, comparing every white pixel against every other one
+# [NOTE]: Kept as a reference implementation to check the faster solvers against (solver=reference)
+def solve_reference(white_pixels, progress=None, workers=1):
+    white_pixels = np.asarray(white_pixels, dtype=np.int32).reshape(-1, 2).tolist()
+    if len(white_pixels) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    # Create a new list of solved_white_pixels
+    solved_white_pixels = []
+    # Loop through the list of white_pixels and identify the ordered pair that has the least neighbors
+    least_neighbors = 2
+    least_neighbors_index = 0
+    # Report progress at most once per outer iteration, so the inner loop only does the comparison
+    next_report = progress.start("Counting neighbors", len(white_pixels)) if progress is not None else len(white_pixels) + 1
+    for i in range(0, len(white_pixels)):
+        if i >= next_report:
+            next_report = progress.update(i)
+        neighbors = 0
+        for j in range(0, len(white_pixels)):
+            if i != j:
+                if abs(white_pixels[i][0] - white_pixels[j][0]) <= 1:
+                    if abs(white_pixels[i][1] - white_pixels[j][1]) <= 1:
+                        neighbors += 1
+        if neighbors < least_neighbors:
+            least_neighbors = neighbors
+            least_neighbors_index = i
+    if progress is not None:
+        progress.finish()
+    # Add the pixel with the least neighbors to solved_white_pixels, and pop it from the white_pixels list
+    solved_white_pixels.append(white_pixels.pop(least_neighbors_index))
+    # Loop through white_pixels, identifying the closest pixel to the current pixel and popping it from the list
+    next_report = progress.start("Solving white pixels", len(white_pixels)) if progress is not None else len(white_pixels) + 1
+    for i in range(0, len(white_pixels)):
+        if i >= next_report:
+            next_report = progress.update(i)
+        # Get the current pixel
+        current_pixel = solved_white_pixels[-1]
+        # Get the distance between the current pixel and the first pixel in white_pixels
+        distance = math.sqrt(((white_pixels[0][0] - current_pixel[0]) ** 2) + ((white_pixels[0][1] - current_pixel[1]) ** 2))
+        # Get the index of the closest pixel
+        closest_pixel_index = 0
+        # Loop through white_pixels, finding the closest pixel
+        for j in range(0, len(white_pixels)):
+            # Get the distance between the current pixel and the current pixel in white_pixels
+            current_distance = math.sqrt(((white_pixels[j][0] - current_pixel[0]) ** 2) + ((white_pixels[j][1] - current_pixel[1]) ** 2))
+            # If the current distance is less than the distance, then set the distance to the current distance and set the closest pixel index to the current index
+            if current_distance < distance:
+                distance = current_distance
+                closest_pixel_index = j
+        # Add the closest pixel to the solved_white_pixels list, and pop it from the white_pixels list
+        solved_white_pixels.append(white_pixels.pop(closest_pixel_index))
+    if progress is not None:
+        progress.finish()
+    return np.array(solved_white_pixels, dtype=np.int32)
+
+# Components with fewer pixels than this in total are solved in this process, as starting the work elsewhere would cost more
+PARALLEL_MIN_PIXELS = 20000
+
+# Split white pixels into the connected pieces (8-connected) of the skeleton they came from
+# Each piece keeps its pixels in the same order as they were given, and the pieces come largest first
+def split_components(white_pixels):
+    white_pixels = np.asarray(white_pixels, dtype=np.int32).reshape(-1, 2)
+    if len(white_pixels) == 0:
+        return []
+    # Draw the pixels onto a canvas just big enough for them, and label its connected pieces
+    low = white_pixels.min(axis=0)
+    shifted = white_pixels - low
+    canvas = np.zeros((shifted[:, 1].max() + 1, shifted[:, 0].max() + 1), np.uint8)
+    canvas[shifted[:, 1], shifted[:, 0]] = 255
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(canvas, connectivity=8)
+    pixel_labels = labels[shifted[:, 1], shifted[:, 0]]
+    order = np.argsort(pixel_labels, kind="stable")
+    components = np.split(white_pixels[order], np.cumsum(np.bincount(pixel_labels, minlength=count))[:-1])
+    return sorted((component for component in components if len(component) > 0), key=len, reverse=True)
+
+# Solve a batch of components with the grid solver (runs in a worker process)
+def _solve_component_batch(components):
+    return [solve_grid(component) for component in components]
+
+# Process pool shared by every solve_components call (created on first use, and again only if more workers are asked for)
+# Workers are spawned rather than forked, so they don't inherit locks held by the WebUI's or the logger's threads
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+# Shut down the shared process pool (called when the program exits)
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+atexit.register(shutdown_pool)
+
+# Order white pixels one connected piece of the skeleton at a time, spreading the pieces over "workers" processes
+# (0 uses every CPU core), then chain the pieces with a nearest-neighbour pass over their ends
+# Each piece is walked with the grid solver, so a drawing made of many separate strokes solves in parallel
+def solve_components(white_pixels, progress=None, workers=0):
+    components = split_components(white_pixels)
+    if len(components) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    # More workers than CPU cores would only take turns
+    workers = min(workers, os.cpu_count() or 1) if workers > 0 else (os.cpu_count() or 1)
+    total = sum(len(component) for component in components)
+    next_report = progress.start("Solving components", total) if progress is not None else total + 1
+    done = 0
+    if workers == 1 or len(components) == 1 or total < PARALLEL_MIN_PIXELS:
+        solved = []
+        for component in components:
+            solved.append(solve_grid(component))
+            done += len(component)
+            if done >= next_report:
+                next_report = progress.update(done)
+    else:
+        # Deal the pieces out largest first, each to the batch with the fewest pixels so far, so the batches come out even
+        batches = [[] for _ in range(min(workers, len(components)))]
+        batch_sizes = [0] * len(batches)
+        for number, component in enumerate(components):
+            smallest = batch_sizes.index(min(batch_sizes))
+            batches[smallest].append((number, component))
+            batch_sizes[smallest] += len(component)
+        pool = _get_pool(workers)
+        futures = {pool.submit(_solve_component_batch, [component for _, component in batch]): batch for batch in batches}
+        solved = [None] * len(components)
+        for future in as_completed(futures):
+            for (number, component), result in zip(futures[future], future.result()):
+                solved[number] = result
+                done += len(component)
+            if done >= next_report:
+                next_report = progress.update(done)
+    if progress is not None:
+        progress.finish()
+    # Chain the solved pieces together, drawing each from whichever of its ends is closer to the last one
+    starts = np.array([points[0] for points in solved], dtype=np.float64)
+    ends = np.array([points[-1] for points in solved], dtype=np.float64)
+    tour = nearest_neighbor_tour(starts, ends)
+    return np.concatenate([solved[number][::-1] if flipped else solved[number] for number, flipped in zip(tour.order, tour.flipped)])
+
+# Available solvers, selected with the "solver" option
+SOLVERS = {
+    "grid": solve_grid,
+    "components": solve_components,
+    "reference": solve_reference,
+}
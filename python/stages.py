@@ -0,0 +1,97 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import threading # General
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# A pipeline as a graph of named stages, where each stage's output is a function of the outputs of the stages it depends on
+# Nothing is computed until something asks for an output, and then only the stages it depends on are run
+# Each output is kept (memoized) until one of the stages it was computed from, or one of the parameters it was computed with, changes
+class StageGraph:
+    def __init__(self):
+        self.stages = {}
+        self.values = {}
+        # Current value of each parameter (e.g. an option) that stages were computed with
+        self.params = {}
+        # get() runs the inputs of a stage from inside its own call, so the same thread may take the lock again
+        self.lock = threading.RLock()
+
+    # Add a stage called "name", whose output is function(*outputs of "inputs") and also depends on the parameters in "params"
+    # Stages that are only ever given a value with set() (like the input image) don't need to be added
+    # Adding a stage again with the same definition keeps its output
+    def add(self, name, function, inputs=(), params=()):
+        with self.lock:
+            stage = (function, tuple(inputs), frozenset(params))
+            if self.stages.get(name) == stage:
+                return
+            self.stages[name] = stage
+            self.invalidate(name)
+
+    # Give a stage its output directly (e.g. the image everything else is computed from)
+    # Everything computed from its old output is thrown away
+    def set(self, name, value):
+        with self.lock:
+            self.invalidate(name)
+            self.values[name] = value
+
+    # Get the output of a stage, running it (and any of its inputs that haven't been run yet) if needed
+    # Raises KeyError for a stage that was never added nor set
+    def get(self, name):
+        with self.lock:
+            if name in self.values:
+                return self.values[name]
+            if name not in self.stages:
+                raise KeyError(f"Stage \"{name}\" has no value and no function to compute it")
+            function, inputs, params = self.stages[name]
+            value = function(*(self.get(stage) for stage in inputs))
+            self.values[name] = value
+            return value
+
+    # Whether a stage's output is already there, so that getting it is free
+    def is_ready(self, name):
+        with self.lock:
+            return name in self.values
+
+    # Get the names of the stages whose outputs are already there
+    def ready(self):
+        with self.lock:
+            return set(self.values)
+
+    # Get the names of every stage computed from "name", directly or through other stages
+    def dependents(self, name):
+        with self.lock:
+            found = set()
+            pending = [name]
+            while pending:
+                current = pending.pop()
+                for stage, (function, inputs, params) in self.stages.items():
+                    if current in inputs and stage not in found:
+                        found.add(stage)
+                        pending.append(stage)
+            return found
+
+    # Throw away the output of "name" and of every stage computed from it, so they are run again the next time they are asked for
+    def invalidate(self, name):
+        with self.lock:
+            for stage in self.dependents(name) | {name}:
+                self.values.pop(stage, None)
+
+    # Set the values of parameters, throwing away the outputs of the stages that depend on one that changed
+    # Get the names of the stages whose outputs were thrown away (the ones that will be run again)
+    def set_params(self, values):
+        with self.lock:
+            changed = {key for key, value in values.items() if key not in self.params or self.params[key] != value}
+            self.params.update(values)
+            ready = self.ready()
+            for stage, (function, inputs, params) in list(self.stages.items()):
+                if params & changed:
+                    self.invalidate(stage)
+            return ready - self.ready()
@@ -0,0 +1,156 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import cv2 # OpenCV
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Thinning is in cv2.ximgproc, which only comes with opencv-contrib-python
+# Without it, zhangsuen and guohall fall back to the NumPy lookup table version of the same rules
+HAS_XIMGPROC = hasattr(cv2, "ximgproc")
+
+# Offsets (dy, dx) of the 8 neighbours P2..P9 of a pixel, clockwise from the top, as in the Zhang-Suen paper
+# Neighbour i is bit i of a pixel's neighbourhood code, so each code (0-255) stands for one pattern of neighbours
+NEIGHBOURS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+# Whether the center pixel can be removed in each of the two sub-iterations of Zhang-Suen, given its neighbours P2..P9
+def zhangsuen_rules(p2, p3, p4, p5, p6, p7, p8, p9):
+    neighbours = (p2, p3, p4, p5, p6, p7, p8, p9)
+    # Number of 0 -> 1 changes going once around the pixel, and number of set neighbours
+    changes = sum(1 for i in range(8) if not neighbours[i] and neighbours[(i + 1) % 8])
+    count = sum(neighbours)
+    removable = changes == 1 and 2 <= count <= 6
+    return (removable and not (p2 and p4 and p6) and not (p4 and p6 and p8),
+            removable and not (p2 and p4 and p8) and not (p2 and p6 and p8))
+
+# Whether the center pixel can be removed in each of the two sub-iterations of Guo-Hall, given its neighbours P2..P9
+def guohall_rules(p2, p3, p4, p5, p6, p7, p8, p9):
+    connectivity = (not p2 and (p3 or p4)) + (not p4 and (p5 or p6)) + (not p6 and (p7 or p8)) + (not p8 and (p9 or p2))
+    count = min((p9 or p2) + (p3 or p4) + (p5 or p6) + (p7 or p8), (p2 or p3) + (p4 or p5) + (p6 or p7) + (p8 or p9))
+    removable = connectivity == 1 and 2 <= count <= 3
+    return (removable and not ((p6 or p7 or not p9) and p8),
+            removable and not ((p2 or p3 or not p5) and p4))
+
+# Thinning rules that thin_lut can build a lookup table from
+THINNING_RULES = {
+    "zhangsuen": zhangsuen_rules,
+    "guohall": guohall_rules,
+}
+
+# Lookup tables built so far, one (2, 256) array of "can be removed" per sub-iteration and neighbourhood code
+_tables = {}
+
+# Get (building it the first time) the lookup table for the rules called "name"
+def get_table(name):
+    if name not in _tables:
+        rules = THINNING_RULES[name]
+        table = np.zeros((2, 256), dtype=bool)
+        for code in range(256):
+            table[:, code] = rules(*(bool(code >> bit & 1) for bit in range(8)))
+        _tables[name] = table
+    return _tables[name]
+
+# A thinning run over a binary image: a flat copy of the image with a blank 1 pixel margin, so each neighbour of a pixel
+# is a fixed offset away and never out of bounds, and which of its pixels may be removed
+# Like cv2.ximgproc.thinning, pixels of 128 or more are set (the resized image has grey edges) and pixels on the edge
+# of the image are never removed
+class ThinningState:
+    def __init__(self, image):
+        self.height, self.width = image.shape[:2]
+        self.padded = np.pad(image >= 128, 1).astype(np.uint8)
+        self.flat = self.padded.ravel()
+        self.offsets = np.array([dy * (self.width + 2) + dx for dy, dx in NEIGHBOURS])
+        self.weights = 1 << np.arange(8)
+        movable = np.zeros_like(self.padded, dtype=bool)
+        movable[2:self.height, 2:self.width] = True
+        self.movable = movable.ravel()
+        self.marked = np.zeros_like(self.flat, dtype=bool)
+
+    # Get the neighbourhood code of each pixel in "pixels" (flat indices)
+    def codes(self, pixels):
+        return self.flat[pixels[:, None] + self.offsets] @ self.weights
+
+    # Remove pixels with the lookup table until none are left to remove, starting from "pixels" (flat indices)
+    # A pixel's fate only depends on its neighbours, so each sub-iteration only looks at the pixels whose neighbours
+    # changed since that sub-iteration last looked at them, instead of the whole image
+    def thin(self, table, pixels, movable=None):
+        movable = self.movable if movable is None else movable
+        flat, marked = self.flat, self.marked
+        # Pixels still to be looked at by each of the two sub-iterations
+        pending = [pixels, pixels]
+        step = 0
+        while len(pending[0]) > 0 or len(pending[1]) > 0:
+            active = pending[step]
+            remove = table[step][self.codes(active)]
+            pending[step] = active[:0]
+            if remove.any():
+                removed = active[remove]
+                flat[removed] = 0
+                # The set pixels next to a removed one have to be looked at again by both sub-iterations
+                # (marked on a mask rather than sorted, to drop the duplicates quickly)
+                marked[(removed[:, None] + self.offsets).ravel()] = True
+                marked &= movable & (flat == 1)
+                pending[step] = np.flatnonzero(marked)
+                marked[pending[1 - step]] = True
+                marked &= flat == 1
+                pending[1 - step] = np.flatnonzero(marked)
+                marked[:] = False
+            step = 1 - step
+
+    # Get the thinned image (white on black)
+    def result(self):
+        return self.padded[1:-1, 1:-1] * np.uint8(255)
+
+# Thin a binary image (white on black) to a 1 pixel wide skeleton with a lookup table of the thinning rules, in NumPy
+# Gives the same skeleton as cv2.ximgproc.thinning with the same rules
+def thin_lut(image, distance_map=None, rules="zhangsuen"):
+    state = ThinningState(image)
+    # Start from the set pixels that have at least one blank neighbour (the others can't be removed yet)
+    pixels = np.flatnonzero(state.flat & state.movable)
+    state.thin(get_table(rules), pixels[state.codes(pixels) != 255])
+    return state.result()
+
+# Zhang-Suen thinning with cv2.ximgproc (or the lookup table version without it)
+def thin_zhangsuen(image, distance_map=None):
+    if not HAS_XIMGPROC:
+        return thin_lut(image, rules="zhangsuen")
+    return cv2.ximgproc.thinning(image, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+
+# Guo-Hall thinning with cv2.ximgproc (or the lookup table version without it), which keeps diagonal lines a little cleaner
+def thin_guohall(image, distance_map=None):
+    if not HAS_XIMGPROC:
+        return thin_lut(image, rules="guohall")
+    return cv2.ximgproc.thinning(image, thinningType=cv2.ximgproc.THINNING_GUOHALL)
+
+# Peel the shape one layer of the distance map at a time, from the edge inwards, with the Zhang-Suen lookup table
+# Each layer is thinned before the next one may be touched, so what is left follows the ridge of the distance map
+# (the centre line of each stroke) more closely than plain thinning does on thick strokes, and it stays connected
+# Reuses the distance map of the image if one is given
+def thin_ridge(image, distance_map=None):
+    if distance_map is None:
+        distance_map = cv2.distanceTransform((image >= 128).astype(np.uint8), cv2.DIST_L2, 5)
+    state = ThinningState(image)
+    table = get_table("zhangsuen")
+    layers = np.pad(np.ceil(distance_map).astype(np.int32), 1).ravel()
+    # A normalized distance map (see normalize_distance_map) is peeled in the same order, just in thinner layers
+    for layer in np.unique(layers[state.flat == 1]):
+        pixels = np.flatnonzero((layers == layer) & (state.flat == 1) & state.movable)
+        state.thin(table, pixels, state.movable & (layers <= layer))
+    return state.result()
+
+# Available thinning backends, selected with the "thinning" option
+# Every backend takes the image's distance map too, so they can be called the same way (only ridge uses it)
+THINNING_BACKENDS = {
+    "zhangsuen": thin_zhangsuen,
+    "guohall": thin_guohall,
+    "lut": thin_lut,
+    "ridge": thin_ridge,
+}
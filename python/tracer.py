@@ -0,0 +1,129 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Attempt to import all necessary libraries
+try:
+    import cv2 # OpenCV
+    import numpy as np # Numpy
+except ImportError as e:
+    print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
+    print("In addition, make sure you are running Python 3.8")
+    print("Try running `python3 -m pip install -r requirements.txt`")
+    print("Note: This file cannot be run standalone. You must run `python3 main.py`")
+    print(f"Traceback: {e}")
+    quit()
+
+# Offsets of the 8 neighbours of a pixel, in row-major order
+NEIGHBOR_OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+# Offsets of the 4 diagonal neighbours of a pixel
+DIAGONAL_OFFSETS = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+
+# 3x3 kernel that sums the 4 side-by-side neighbours of a pixel
+SIDE_KERNEL = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]], np.float32)
+
+# Whether two neighbouring pixels are linked: side by side, or diagonal with neither corner pixel between them set
+# [NOTE]: Where a thinned line steps sideways, the diagonal is already covered by the path through the corner pixel,
+# so counting it too would make every step of a staircase look like a junction and split the line there
+def is_linked(pixel, neighbor, degree):
+    dx, dy = neighbor[0] - pixel[0], neighbor[1] - pixel[1]
+    return dx == 0 or dy == 0 or ((pixel[0] + dx, pixel[1]) not in degree and (pixel[0], pixel[1] + dy) not in degree)
+
+# Get the pixels of the skeleton that a pixel is linked to
+def linked_neighbors(pixel, degree):
+    for dx, dy in NEIGHBOR_OFFSETS:
+        neighbor = (pixel[0] + dx, pixel[1] + dy)
+        if neighbor in degree and is_linked(pixel, neighbor, degree):
+            yield neighbor
+
+# Count the linked neighbours (see is_linked) of every pixel in the skeleton, with a convolution for the side-by-side ones
+# and shifted copies of the mask for the diagonal ones
+def neighbor_counts(skeleton):
+    if skeleton.ndim == 3:
+        skeleton = skeleton[:, :, 0]
+    mask = (skeleton == 255).astype(np.uint8)
+    height, width = mask.shape
+    padded = np.pad(mask, 1)
+    def shifted(dx, dy):
+        return padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+    counts = cv2.filter2D(mask, -1, SIDE_KERNEL, borderType=cv2.BORDER_CONSTANT)
+    for dx, dy in DIAGONAL_OFFSETS:
+        counts += shifted(dx, dy) & (1 - shifted(dx, 0)) & (1 - shifted(0, dy))
+    return mask, counts
+
+# Walk along a branch of the skeleton from "start" through "current" until reaching an endpoint/junction (or a dead end)
+def walk_branch(start, current, degree, visited):
+    stroke = [start]
+    previous = start
+    while True:
+        stroke.append(current)
+        # Endpoints and junctions end the branch, and can be shared with other branches
+        if degree[current] != 2:
+            break
+        visited.add(current)
+        following = None
+        for candidate in linked_neighbors(current, degree):
+            if candidate == previous:
+                continue
+            if degree[candidate] == 2 and candidate in visited:
+                continue
+            following = candidate
+            break
+        if following is None:
+            break
+        previous, current = current, following
+    return stroke
+
+# Trace a 1-pixel-wide skeleton into a list of strokes ((n, 2) int32 arrays of [x, y]) by walking its 8-connected pixels
+# Every pixel is visited once, so this runs in linear time
+def trace_skeleton(skeleton, progress=None):
+    if progress is not None:
+        progress.start("Tracing skeleton", 1)
+    mask, counts = neighbor_counts(skeleton)
+    ys, xs = np.nonzero(mask)
+    # Map of (x, y) -> number of linked neighbours, in row-major order
+    degree = dict(zip(zip(xs.tolist(), ys.tolist()), counts[ys, xs].tolist()))
+    # Branch pixels that are already part of a stroke
+    visited = set()
+    # Links directly between two endpoints/junctions that are already part of a stroke
+    used_links = set()
+    strokes = []
+    # Start a stroke on every unused branch leaving an endpoint or junction
+    for node, node_degree in degree.items():
+        if node_degree == 2:
+            continue
+        if node_degree == 0:
+            strokes.append([node])
+            continue
+        for neighbor in linked_neighbors(node, degree):
+            if degree[neighbor] == 2:
+                if neighbor in visited:
+                    continue
+            else:
+                link = (min(node, neighbor), max(node, neighbor))
+                if link in used_links:
+                    continue
+                used_links.add(link)
+            strokes.append(walk_branch(node, neighbor, degree, visited))
+    # Anything left over is a closed loop with no endpoints or junctions
+    for pixel, pixel_degree in degree.items():
+        if pixel_degree != 2 or pixel in visited:
+            continue
+        visited.add(pixel)
+        neighbor = next(linked_neighbors(pixel, degree))
+        stroke = walk_branch(pixel, neighbor, degree, visited)
+        stroke.append(pixel)
+        strokes.append(stroke)
+    if progress is not None:
+        progress.finish()
+    return [np.array(stroke, dtype=np.int32) for stroke in strokes]
+
+# Join a list of strokes back into one (n, 2) array of points
+def flatten_strokes(strokes):
+    if len(strokes) == 0:
+        return np.zeros((0, 2), np.int32)
+    return np.concatenate(strokes)
+
+# Check whether a list of points is actually a list of strokes
+def is_stroke_list(points):
+    return len(points) > 0 and len(points[0]) > 0 and not np.isscalar(points[0][0])
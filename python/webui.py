@@ -4,11 +4,17 @@
 # Attempt to import all necessary libraries
 try:
     import os, time # General
-    from flask import Flask, render_template, send_from_directory, request, url_for, send_file # Flask
-    from rich import print as rich_print # Pretty print
+    from flask import Flask, render_template, send_from_directory, request, url_for, Response, stream_with_context, jsonify, session # Flask
     from rich.traceback import install # Pretty traceback
     install() # Install traceback
-    from python.autoclass import AutoClass # AutoClass
+    from python.logger import log_print # Logging
+    from python.jobs import JobManager, JobQueueFull # Per-session jobs
+    from python.autoclass import TUNABLE_OPTIONS # Options that can change after the image is prepared
+    from python.pipeline import DEFAULT_OPTIONS, PipelineError, PipelineResult, convert # Image -> gcode conversion
+    from python.preview import PreviewCache # Preview images
+    from python.cache import cache_from_options # Result cache
+    from python.profiler import StageProfiler, MetricsCollector # Stage metrics
+    from python.gcode import head_gcode # Gcode preview
 except ImportError as e:
     print("[INFO] You are missing one or more libraries. Please use PIP to install any missing libraries.")
     print("In addition, make sure you are running Python 3.8")
@@ -20,27 +26,15 @@ except ImportError as e:
 # Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
 maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..") 
 
+# Number of gcode lines shown in the demo page (the full program is streamed from /gcode/<filename>)
+GCODE_PREVIEW_LINES = 1000
+
+# Name of this script's log file
+script_name = os.path.splitext(os.path.basename(__file__))[0]
+
 # Custom low-level functions
-def print(text="", log_filename="", end="\n", max_file_mb=10):
-    global maindirectory
-    script_name = os.path.splitext(os.path.basename(__file__))[0]
-    if log_filename == "":
-        log_filename = f"{script_name}.log"
-    log_file_path = os.path.join(maindirectory, "logs", log_filename)
-    if os.path.exists(log_file_path) and os.path.getsize(log_file_path) > max_file_mb * 1024 * 1024:
-        try:
-            with open(log_file_path, "w") as f:
-                f.write("")
-        except Exception as e:
-            rich_print(f"[red][ERROR][/red]: {e}")
-            rich_print(f"[red][ERROR][/red]: Could not clear log file at {log_file_path}.")
-    try:
-        with open(log_file_path, "a") as f:
-            f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {text}\n")
-    except Exception as e:
-        rich_print(f"[red][ERROR][/red]: {e}")
-        rich_print(f"[red][ERROR][/red]: Could not clear log file at {log_file_path}.")
-    rich_print(text, end=end)
+def print(text="", log_filename="", end="\n", max_file_mb=10, level="info"):
+    log_print(text, log_filename or f"{script_name}.log", end, max_file_mb, level)
 
 class WebUI:
     def __init__(self, opts_dict):
@@ -50,13 +44,25 @@ class WebUI:
         # Initialize Flask
         self.app = Flask(__name__, template_folder=os.path.join(maindirectory, "html"), static_folder=os.path.join(maindirectory, "html", "static"))
 
+        # Sign the session cookie that ties each browser to its job (a new key each run, so old sessions simply start over)
+        self.app.secret_key = os.urandom(24)
+
         # Define the options dictionary
         self.opts_dict = opts_dict
 
         # Modify opts_dict[]
         
-        # Create the AutoClass object
-        self.auto_obj = AutoClass(self.opts_dict)
+        # Each browser session gets its own job (AutoClass + folder), and heavy stages run on a bounded worker pool
+        self.jobs = JobManager(self.opts_dict, max_workers=int(self.opts_dict.get("web_workers", 2)), max_pending=int(self.opts_dict.get("web_queue_size", 8)))
+
+        # Encoded previews of each job's demo steps, so each one is only encoded once
+        self.previews = PreviewCache()
+
+        # Stage results of earlier API conversions, so a re-submitted drawing skips straight to the gcode
+        self.cache = cache_from_options(self.opts_dict)
+
+        # Stage timings (and memory, when profiling) of recent conversions, for the metrics endpoint
+        self.metrics = MetricsCollector()
 
         # Init the main website text log
         self.web_text = ""
@@ -72,10 +78,24 @@ class WebUI:
         def about():
             return render_template('about.html')
         
-        # Route to serve the image
-        @self.app.route('/files/<filename>')
-        def serve_custom_file(filename):
-            return send_file(os.path.join(maindirectory, "temp", filename))
+        # Route to serve a file from a job's folder (e.g. the image at the current step)
+        @self.app.route('/jobs/<job_id>/files/<filename>')
+        def serve_job_file(job_id, filename):
+            job = self.jobs.get_job(job_id)
+            if job is None:
+                return "Job not found.", 404
+            return send_from_directory(job.directory, filename)
+        
+        # Route to serve a small JPEG preview of the image at one of a job's demo steps, encoded on first request
+        @self.app.route('/preview/<job_id>/<stage>')
+        def serve_preview(job_id, stage):
+            job = self.jobs.get_job(job_id)
+            if job is None or stage not in job.previews:
+                return "Preview not found.", 404
+            version, image = job.previews[stage]
+            data = self.previews.get_or_encode((job_id, stage, version), image)
+            # The URL changes with the version, so the browser can keep its copy
+            return Response(data, mimetype="image/jpeg", headers={"Cache-Control": "private, max-age=3600"})
         
         # Route for serving live demo
         @self.app.route('/demo.html', methods=['GET', 'POST'])
@@ -84,37 +104,232 @@ class WebUI:
                 task = str(request.args.get('task'))  # Get the value of the 'task' GET variable
             except TypeError:
                 task = "1"
+            job = self.get_session_job()
             if request.method == 'POST':
                 print("[indian_red1][WEBUI][/indian_red1] POST request received, saving image...")
                 # Check if file is uploaded
                 if 'file' in request.files:
                     file = request.files['file']
-                    # Save the uploaded file as "web_input.png"
-                    file.save(os.path.join(maindirectory, "temp", "input.png"))
-                    print(f"[indian_red1][WEBUI][/indian_red1] Image saved successfully to \"{os.path.join(maindirectory, 'temp', 'input.png')}\"")
+                    # Save the uploaded file into this session's job folder
+                    with job.lock:
+                        file.save(job.auto_obj.program_input_filename)
+                        job.reset()
+                        job.previews = {}
+                        # Start a new profile for the new image
+                        job.auto_obj.take_profile()
+                    print(f"[indian_red1][WEBUI][/indian_red1] Image saved successfully to \"{job.auto_obj.program_input_filename}\"")
                     # Run build_html function to get HTML based on task and processing
-                    heading, content = self.build_html(task="2")
+                    heading, content = self.build_html(job, task="2")
                     return render_template('demo.html', app_heading=str(heading), app_content=str(content))
             # Serve page based on task
-            heading, content = self.build_html(task)
+            heading, content = self.build_html(job, task)
             return render_template('demo.html', app_heading=str(heading), app_content=str(content))
         
+        # Route to stream the gcode for this session's solved pixels, without building the whole program in memory
+        @self.app.route('/gcode/<filename>')
+        def stream_gcode(filename):
+            job = self.get_session_job()
+            if job.result is None:
+                return "No gcode has been generated yet.", 404
+            return Response(stream_with_context(job.auto_obj.iter_gcode(job.result)), mimetype="text/plain", headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+        # Route to poll the progress of this session's current long-running stage (e.g. solving)
+        @self.app.route('/api/progress')
+        def progress():
+            return jsonify(self.get_session_job().progress.snapshot())
+
+        # Route to change some of the TUNABLE_OPTIONS of this session's job, sent as form fields or query args
+        # Only the stages that depend on a changed option are run again: gcode options (e.g. initial_speed) don't re-run any,
+        # ordering, simplifying and machine size options re-run ordering and/or simplifying right away, and a new solver or
+        # thinning backend queues the solve again. Other options (e.g. resolution) are refused, as the image would have to be prepared again
+        # Returns the stages that were invalidated and where to get the new gcode (with 202 if it is being solved again)
+        @self.app.route('/api/options', methods=['POST'])
+        def update_options():
+            job = self.get_session_job()
+            changes = {key: request.values[key] for key in request.values if key in DEFAULT_OPTIONS or key in TUNABLE_OPTIONS}
+            started = time.perf_counter()
+            # Checked under the job's lock, which every request that queues a solve holds too
+            with job.lock:
+                if job.is_busy():
+                    return jsonify({"error": "The skeleton is still being solved, please try again once it is done."}), 409
+                try:
+                    stages = job.auto_obj.update_options(changes)
+                except PipelineError as e:
+                    return jsonify({"error": str(e)}), 400
+                status_code = 200
+                if job.result is not None and stages & {"skeleton", "solved"}:
+                    try:
+                        self.jobs.submit(job, "solve", self.solve_job, job)
+                    except JobQueueFull as e:
+                        # The old strokes no longer match the options, so the demo has to solve again from task 13
+                        job.reset()
+                        return jsonify({"error": str(e)}), 503
+                    status_code = 202
+                elif job.result is not None and stages:
+                    job.result = job.auto_obj.get_strokes()
+                options = {key: getattr(job.auto_obj, TUNABLE_OPTIONS[key]) for key in changes}
+            return jsonify({"options": options, "stages": sorted(stages), "seconds": time.perf_counter() - started, "status_url": url_for("job_status", job_id=job.id), "gcode_url": url_for("stream_gcode", filename=os.path.basename(str(self.opts_dict['output'])))}), status_code
+
+        # Route to get the number of jobs and how busy the worker pool is
+        @self.app.route('/api/jobs')
+        def jobs_status():
+            return jsonify(self.jobs.stats())
+
+        # Route to poll the status of a job's background task
+        @self.app.route('/api/jobs/<job_id>')
+        def job_status(job_id):
+            job = self.jobs.get_job(job_id)
+            if job is None:
+                return jsonify({"error": "Job not found."}), 404
+            return jsonify(job.snapshot())
+
+        # Route to convert an image to gcode in one request, instead of stepping through the demo
+        # The image is sent as a "file" upload (or as the request body), and options as form fields or query args
+        # Returns the gcode as a stream, or JSON with the points and per-stage timings if "format" is "json"
+        # If "async" is true, the job's ID is returned to poll instead of waiting for the conversion to finish
+        @self.app.route('/api/convert', methods=['POST'])
+        def api_convert():
+            image = request.files['file'].read() if 'file' in request.files else request.get_data()
+            if not image:
+                return jsonify({"error": "No image was sent. Upload it as \"file\" or send it as the request body."}), 400
+            response_format = request.values.get("format", "gcode")
+            if response_format not in ("gcode", "json"):
+                return jsonify({"error": f"Unknown format \"{response_format}\". Available formats: gcode, json"}), 400
+            opts = self.get_request_options()
+            # Conversions always run on the bounded worker pool, so a crowd of requests gets JobQueueFull instead of piling up
+            job = self.jobs.create_job(with_autoclass=False)
+            try:
+                future = self.jobs.submit(job, "convert", self.run_conversion, image, opts, job.progress, job.id)
+            except JobQueueFull as e:
+                self.jobs.remove_job(job.id)
+                return jsonify({"error": str(e)}), 503
+            if request.values.get("async", "false").lower() in ("true", "1", "yes"):
+                return jsonify({"id": job.id, "status_url": url_for("job_status", job_id=job.id), "result_url": url_for("job_result", job_id=job.id, format=response_format)}), 202
+            # Otherwise wait for it here, and forget the job once it is done
+            try:
+                future.result()
+            finally:
+                self.jobs.remove_job(job.id)
+            if isinstance(job.exception, PipelineError):
+                return jsonify({"error": str(job.exception)}), 400
+            if job.error:
+                return jsonify({"error": job.error}), 500
+            return self.conversion_response(job.result, response_format)
+
+        # Route to get the result of a conversion queued with /api/convert, once it has finished
+        @self.app.route('/api/jobs/<job_id>/result')
+        def job_result(job_id):
+            job = self.jobs.get_job(job_id)
+            if job is None:
+                return jsonify({"error": "Job not found."}), 404
+            status = job.status()
+            if status == "failed":
+                return jsonify(job.snapshot()), 400
+            if status != "done":
+                return jsonify(job.snapshot()), 202
+            if not isinstance(job.result, PipelineResult):
+                return jsonify({"error": "This job has no conversion result."}), 404
+            return self.conversion_response(job.result, request.args.get("format", "gcode"))
+
+        # Route to get the per-stage timings (and memory, when profiling) of recent conversions, to track regressions
+        @self.app.route('/api/metrics')
+        def metrics():
+            summary = self.metrics.summary()
+            summary["jobs"] = self.jobs.stats()
+            return jsonify(summary)
+
         # Route to serve the terminal logs
         @self.app.route('/logs/<filename>')
         def send_log_file(filename):
             return send_from_directory(os.path.join(maindirectory, "logs"), filename)
 
     def run(self):
-        self.app.run()
+        try:
+            self.app.run()
+        finally:
+            self.jobs.shutdown()
+
+    # Get the job for the current browser session, creating one if it doesn't have one yet (or it has expired)
+    def get_session_job(self):
+        job = self.jobs.get_job(session.get("job_id", ""))
+        if job is None:
+            job = self.jobs.create_job()
+            session["job_id"] = job.id
+        return job
+
+    # Get the conversion options for an API request: the program's own options, overridden by any sent with the request
+    def get_request_options(self):
+        opts = {key: self.opts_dict[key] for key in DEFAULT_OPTIONS if key in self.opts_dict}
+        for key in DEFAULT_OPTIONS:
+            if key in request.values:
+                opts[key] = request.values[key]
+        return opts
+
+    # Build the response for a finished conversion, either the streamed gcode or JSON with the points and stats
+    def conversion_response(self, result, response_format="gcode"):
+        if response_format == "json":
+            return jsonify({"moves": result.moves, "points": result.points.tolist(), "stats": result.stats})
+        return Response(stream_with_context(result.iter_gcode()), mimetype="text/plain", headers={"Content-Disposition": f"attachment; filename={os.path.basename(str(self.opts_dict['output']))}"})
+
+    # Convert an image for the API with the result cache, adding its profile to the metrics
+    def run_conversion(self, image, opts, progress=None, job_id=""):
+        profiler = StageProfiler(job_id or "api", track_memory=bool(self.opts_dict.get("profile", False)))
+        try:
+            result = convert(image, opts, progress, self.cache, profiler)
+        finally:
+            profiler.close()
+        self.metrics.add(profiler.report())
+        return result
+
+    # Solve, order and simplify the job's skeleton (runs on a worker thread)
+    def solve_job(self, job):
+        # The skeleton was already worked out by the previous step, so only solving, ordering and simplifying are run here
+        return job.auto_obj.get_strokes()
     
-    def display_image_html(self, img_path="input.png", img_width="100%", img_height="auto"):
+    def display_image_html(self, job, img_path="input.png", img_width="100%", img_height="auto"):
         # If the file doesn't exist, return an error
-        if not os.path.exists(os.path.join(maindirectory, "temp", img_path)):
+        if not os.path.exists(job.path(img_path)):
             return "<p>ERROR: Image not found.</p>"
         # Return the HTML of the image
-        return f'<img src="{url_for("serve_custom_file", filename=img_path)}" width="{img_width}" height="{img_height}">'
+        return f'<img src="{url_for("serve_job_file", job_id=job.id, filename=img_path)}" width="{img_width}" height="{img_height}">'
     
-    def build_html(self, task=-1):        
+    def display_preview_html(self, job, stage, img_width="100%", img_height="auto"):
+        # If the step hasn't been run, return an error
+        if stage not in job.previews:
+            return "<p>ERROR: Image not found.</p>"
+        # Return the HTML of the preview, versioned so the browser fetches it again if the step is re-run
+        return f'<img src="{url_for("serve_preview", job_id=job.id, stage=stage, v=job.previews[stage][0])}" width="{img_width}" height="{img_height}">'
+
+    def build_html(self, job, task=-1):
+        # While the job's background task is running, only show its progress
+        if job.is_busy():
+            return self.build_busy_html(job)
+        # Only one request (or background task) works on a job at a time
+        with job.lock:
+            return self.build_task_html(job, task)
+
+    # Page shown while a job's background task is queued or running, which reloads once the task has finished
+    def build_busy_html(self, job):
+        welcome_text = "Solving Skeleton"
+        text_content = "<p>The skeleton is being solved in the background. This page will continue on its own once it is done.</p>"
+        text_content += "<p id='progress'>Waiting in queue...</p>"
+        text_content += "<hr><div>"
+        text_content += "<a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
+        text_content += "</div>"
+        # Poll the job's status and progress until it has finished
+        text_content += "<script>function pollJob() { fetch('" + url_for("job_status", job_id=job.id) + "').then(function(response) { return response.json(); }).then(function(status) { if (status.status == 'done' || status.status == 'failed') { window.location.href = '/demo.html?task=13'; return; } if (status.status == 'running' && status.progress.total > 0) { document.getElementById('progress').innerText = status.progress.stage + ': ' + Math.round(status.progress.fraction * 100) + '%'; } setTimeout(pollJob, 500); }); } pollJob();</script>"
+        return (welcome_text, text_content)
+
+    # Page shown when a job's background task failed (or a step was skipped)
+    def build_failed_html(self, job, error=""):
+        welcome_text = "Error has occurred"
+        text_content = f"<p>[ERROR]: {error or job.error}</p>"
+        text_content += "<hr><div>"
+        text_content += "<a class='btn btn-primary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
+        text_content += "</div>"
+        return (welcome_text, text_content)
+
+    def build_task_html(self, job, task=-1):
         # If task is not set, set it to 1
         if task == -1:
             task = "1"
@@ -138,7 +353,7 @@ class WebUI:
             text_content = "<div>"
             text_content += "<p>Does this image look correct? If not, please go back and try again. Note: Remember that this image must be a solid white background if possible, and must be drawn in black marker or pen.</p><a class='btn btn-primary' href='/demo.html?task=3'><i data-feather='check'></i> Looks good</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='x'></i> Try again</a>"
             text_content += "</div><hr>"
-            text_content += self.display_image_html(img_width="512px")
+            text_content += self.display_image_html(job, img_width="512px")
             # Return the heading and content
             return (welcome_text, text_content)
         elif task == "3":
@@ -146,18 +361,18 @@ class WebUI:
             # Make sure that an output filename is configured
             welcome_text = "Initial Checks & Image Import"
             text_content = ""
-            if not self.auto_obj.is_output_configured():
+            if not job.auto_obj.is_output_configured():
                 text_content = "<p>[ERROR]: No output filename was provided. Please see `python3 main.py --help` for more info.</p>"
                 text_content += "<hr><div>"
                 text_content += "<a class='btn btn-primary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
                 text_content += "</div>"
                 return (welcome_text, text_content)
             # Import the image
-            self.auto_obj.import_image()
-            self.auto_obj.save_image()
+            job.auto_obj.import_image()
+            job.set_preview("imported", job.auto_obj.image)
             # Show the initial image
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "imported", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>This is the initial image that was successfully imported. Now, we will rotate the image 180 degrees, as the camera is mounted upside down in our project.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -165,12 +380,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "4":
             # Rotate the image 180 degrees (we mounted camera upside down)
-            self.auto_obj.rotate_image()
-            self.auto_obj.save_image()
+            job.auto_obj.rotate_image()
+            job.set_preview("rotated", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Flipped Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "rotated", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we will crop the image based on the camera bounds to remove any extra whitespace.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -178,12 +393,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "5":
             # Crop the image based on camera bounds
-            self.auto_obj.crop_image()
-            self.auto_obj.save_image()
+            job.auto_obj.crop_image()
+            job.set_preview("cropped", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Cropped Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "cropped", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we will convert the image to grayscale to remove any color noise.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -191,12 +406,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "6":
             # Convert the image to grayscale
-            self.auto_obj.grayscale_image()
-            self.auto_obj.save_image()
+            job.auto_obj.grayscale_image()
+            job.set_preview("grayscale", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Grayscale Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "grayscale", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we will invert the image to make the background black and the drawing white.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -204,12 +419,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "7":
             # Invert the image
-            self.auto_obj.invert_image()
-            self.auto_obj.save_image()
+            job.auto_obj.invert_image()
+            job.set_preview("inverted", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Inverted Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "inverted", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we will threshold the image to make the image closer to pure black and white.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -217,12 +432,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "8":
             # Threshold the image
-            self.auto_obj.threshold_image()
-            self.auto_obj.save_image()
+            job.auto_obj.threshold_image()
+            job.set_preview("thresholded", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Thresholded Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "thresholded", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we will resize the image to a fixed size as this is how we map gcode to pixels.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -230,12 +445,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "9":
             # Convert the image to a fixed size
-            self.auto_obj.resize_image_fixed(width=1000, height=1000)
-            self.auto_obj.save_image()
+            job.auto_obj.resize_image_fixed()
+            job.set_preview("resized", job.auto_obj.image)
             # Display the image progress
             welcome_text = "Resized Image"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "resized", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Next, we are going to apply a Euclidean distance transform to the image. Distance transforms are used to find the distance of each pixel from the nearest boundary of the image. This will help us find the skeleton of the image.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -243,12 +458,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "10":
             # Apply Euclidean distance transform
-            self.distance_map = self.auto_obj.get_distance_map()
-            self.auto_obj.save_image(self.distance_map)
+            distance_map = job.auto_obj.get_distance_map()
+            job.set_preview("distance_map", distance_map)
             # Display the image progress
             welcome_text = "Distance Map"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "distance_map", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Here is the distance map. It may be very dark, but it exists! Now, we will normalize the distance map.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -256,12 +471,12 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "11":
             # Normalize the distance map
-            self.distance_map = self.auto_obj.normalize_distance_map()
-            self.auto_obj.save_image(self.distance_map)
+            distance_map = job.auto_obj.normalize_distance_map()
+            job.set_preview("normalized_distance_map", distance_map)
             # Display the image progress
             welcome_text = "Normalized Distance Map"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "normalized_distance_map", img_width="512px")
             text_content += "<hr><div>"
             text_content += "<p>Now, we will use a thinning algorithm to get the skeleton of the image. The skeleton will be used to find adjacent points.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
@@ -269,51 +484,80 @@ class WebUI:
             return (welcome_text, text_content)
         elif task == "12":
             # Use thinning method to get skeleton of the image
-            self.skeleton = self.auto_obj.get_skeleton()
-            self.auto_obj.save_image(self.skeleton)
+            skeleton = job.auto_obj.get_skeleton()
+            job.set_preview("skeleton", skeleton)
+            # A new skeleton needs solving again
+            job.reset()
             # Display the image progress
             welcome_text = "Skeleton"
             text_content = ""
-            text_content += self.display_image_html(img_path="input_modified.png", img_width="512px")
+            text_content += self.display_preview_html(job, "skeleton", img_width="512px")
             text_content += "<hr><div>"
-            text_content += "<p>Now, we will solve the skeleton by finding adjacent points. This converts the skeleton into a list of points, sorted by distance to one another.</p>"
+            text_content += "<p>Now, we will solve the skeleton by finding adjacent points. This converts the skeleton into a list of points, sorted by distance to one another, then orders the resulting strokes to keep pen travel short and simplifies them into fewer, longer moves.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
             text_content += "</div>"
             return (welcome_text, text_content)
         elif task == "13":
-            # Solve the skeleton by finding adjacent points
-            self.solved_pixels = self.auto_obj.solve_pixels()
+            # Solve the skeleton by finding adjacent points (or trace it into strokes) in the background
+            if job.status() == "idle":
+                try:
+                    self.jobs.submit(job, "solve", self.solve_job, job)
+                except JobQueueFull as e:
+                    welcome_text = "Server Busy"
+                    text_content = f"<p>The server is busy with other jobs. {e}</p>"
+                    text_content += "<hr><div>"
+                    text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(task) + "'><i data-feather='rotate-cw'></i> Try again</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
+                    text_content += "</div>"
+                    return (welcome_text, text_content)
+                return self.build_busy_html(job)
+            if job.status() == "failed":
+                return self.build_failed_html(job)
             # Convert to string
-            self.solved_pixels_string = [str(i) for i in self.solved_pixels]
+            solved_pixels_string = [str(i.tolist()) for i in job.result]
             # Display the image progress
             welcome_text = "Solved Skeleton Coordinates"
             text_content = ""
-            text_content += "<textarea rows='10' cols='80' readonly>" + str(self.solved_pixels_string) + "</textarea>"
+            text_content += "<textarea rows='10' cols='80' readonly>" + str(solved_pixels_string) + "</textarea>"
             text_content += "<hr><div>"
             text_content += "<p>Now, we will generate gcode based on the solved pixels. This will be the final gcode that will be printed.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='arrow-right'></i> Continue to next step</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
             text_content += "</div>"
             return (welcome_text, text_content)
+        elif task in ("14", "15", "16") and job.result is None:
+            # The later steps need the solved pixels
+            return self.build_failed_html(job, "The skeleton hasn't been solved yet.")
         elif task == "14":
-            # Get the gcode from the solved pixels
-            self.gcode = self.auto_obj.get_gcode(self.solved_pixels)
+            # Get a preview of the gcode from the solved pixels (the full program is streamed when downloaded or written)
+            gcode_preview = head_gcode(job.auto_obj.iter_gcode(job.result), GCODE_PREVIEW_LINES)
             welcome_text = "Gcode"
             text_content = ""
-            text_content += "<p>Here is the gcode that was generated! Please view the code in text-form below, and/or click the button to copy the code to your clipboard, then open an online gcode viewer for you to see the code in action!</p>"
-            text_content += "<textarea rows='10' cols='80' readonly id='gcode' name='gcode'>" + self.gcode + "</textarea>"
+            text_content += f"<p>Here is the gcode that was generated! Please view the code in text-form below (first {GCODE_PREVIEW_LINES} lines), and/or click the button to copy the code to your clipboard, then open an online gcode viewer for you to see the code in action!</p>"
+            text_content += "<textarea rows='10' cols='80' readonly id='gcode' name='gcode'>" + gcode_preview + "</textarea>"
             text_content += "<hr><div>"
             text_content += "<p>Please click one of the buttons to either copy and view the code in a new tab (you need to paste), or to write the code to a file.</p>"
             text_content += "<a class='btn btn-primary' href='/demo.html?task=" + str(int(task)+1) + "'><i data-feather='file-plus'></i> Write gcode to file</a><span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='/demo.html?task=1'><i data-feather='rotate-cw'></i> Restart from beginning</a>"
-            # Button to copy to clipboard and open in new tab
+            # Button to copy to clipboard and open in new tab (fetches the full program, not just the preview)
             text_content += "<span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' href='javascript:void(0)' onclick='copyToClipboard()'><i data-feather='clipboard'></i> Copy to clipboard and open in new tab</a>"
-            text_content += "<script>function copyToClipboard() { var copyText = document.getElementById('gcode'); copyText.select(); copyText.setSelectionRange(0, 99999); document.execCommand('copy'); alert('Reminder: This is opening in a new tab, but the gcode is NOT autofilled. You MUST paste it in the window and click Simulate to view. If the window does not open, make sure to allow popups in your browser.'); window.open('https://nraynaud.github.io/webgcode/', '_blank'); }</script>"
-            # Button to download the gcode using f'<a href="{url_for("serve_custom_file", filename="output.gcode")}">'
-            text_content += "<span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' class='no-load' href='" + url_for("serve_custom_file", filename="output.gcode") + "' target='_blank'><i data-feather='download'></i> Download gcode</a>"
+            text_content += "<script>function copyToClipboard() { fetch('" + url_for("stream_gcode", filename="output.gcode") + "').then(function(response) { return response.text(); }).then(function(text) { return navigator.clipboard.writeText(text); }).then(function() { alert('Reminder: This is opening in a new tab, but the gcode is NOT autofilled. You MUST paste it in the window and click Simulate to view. If the window does not open, make sure to allow popups in your browser.'); window.open('https://nraynaud.github.io/webgcode/', '_blank'); }); }</script>"
+            # Button to download the full gcode, streamed from the solved pixels
+            text_content += "<span style='width: 10px; display: inline-block;'></span><a class='btn btn-secondary' class='no-load' href='" + url_for("stream_gcode", filename="output.gcode") + "' target='_blank'><i data-feather='download'></i> Download gcode</a>"
             text_content += "</div>"
+            # Form to change the machine, gcode and simplification options, which regenerates the gcode without solving the skeleton again
+            text_content += "<hr><p>Want a different machine size, speed or level of detail? Change the options below to regenerate the gcode without solving the skeleton again.</p>"
+            text_content += "<form id='options' class='form-inline' onsubmit='updateOptions(); return false;'>"
+            for key in ("maximum_x", "maximum_y", "border_x", "border_y", "initial_speed", "acceleration", "dwell_time", "simplify_tolerance", "travel_time_budget"):
+                text_content += f"<label style='margin-right: 10px;'>{key}&nbsp;<input type='text' name='{key}' value='{getattr(job.auto_obj, TUNABLE_OPTIONS[key])}' size='6' class='form-control'></label>"
+            text_content += "<button type='submit' class='btn btn-primary'><i data-feather='refresh-cw'></i> Regenerate gcode</button></form>"
+            text_content += "<script>function updateOptions() { fetch('" + url_for("update_options") + "', {method: 'POST', body: new FormData(document.getElementById('options'))}).then(function(response) { return response.json().then(function(result) { if (response.status != 200 && response.status != 202) { alert(result.error); return; } window.location.href = response.status == 202 ? '/demo.html?task=13' : '/demo.html?task=14'; }); }); }</script>"
             return (welcome_text, text_content)
         elif task == "15":
-            # Write the gcode to the output file
-            self.auto_obj.write_gcode(self.gcode)
+            # Stream the gcode into the output file
+            job.auto_obj.write_gcode(job.auto_obj.iter_gcode(job.result))
+            # Save this run's profile into the job's folder, and add it to the metrics
+            report = job.auto_obj.write_profile()
+            if report is not None:
+                report["name"] = job.id
+                self.metrics.add(report)
             welcome_text = "Gcode Written"
             text_content = ""
             text_content += "<p>The gcode has been written to the output file.</p>"
@@ -325,8 +569,8 @@ class WebUI:
         elif task == "16":
             # If get_prefs("execute") is enabled, then we print the gcode using Pronterface
             # NOTE: PRONTERFACE ONLY WORKS ON WINDOWS
-            if self.auto_obj.get_prefs("execute"):
-                self.auto_obj.print_gcode()
+            if job.auto_obj.get_prefs("execute"):
+                job.auto_obj.print_gcode()
                 welcome_text = "Gcode is being Printed"
                 text_content = ""
                 text_content += "<p>If Pronterface is installed and running, the gcode is currently being printed. Next, please cleanup this job before continuing.</p>"
@@ -339,11 +583,9 @@ class WebUI:
             text_content += "</div>"
             return (welcome_text, text_content)
         elif task == "17":
-            # Cleanup
-            self.auto_obj.cleanup()
-            del self.auto_obj
-            # Create the AutoClass object
-            self.auto_obj = AutoClass(self.opts_dict)
+            # Cleanup, deleting this session's job (a fresh one is created on the next visit)
+            self.jobs.remove_job(job.id)
+            session.pop("job_id", None)
             welcome_text = "Demo Complete"
             text_content = ""
             text_content += "<p>The demo is complete. You can now go back to the beginning and try again.</p>"
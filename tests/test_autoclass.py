@@ -0,0 +1,76 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import pytest
+from python.autoclass import AutoClass
+from python.pipeline import PipelineError
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Program options for converting an example image in standalone mode
+def example_options(output, **changes):
+    opts = dict(input=os.path.abspath(os.path.join(maindirectory, "examples", "zig_zag.png")), output=str(output), maximum_x=613, maximum_y=548, initial_speed=50000, border_x=50, border_y=50, debug=False, display=False, dwell_time=10000, acceleration=1000, camera_number=0, pi_mode=False, input_pin=0, execute=False, webui=False, camera_bounds="(0,0)(0,0)", travel_time_budget=0.1)
+    opts.update(changes)
+    return opts
+
+# An AutoClass with its image prepared and every stage up to the strokes already run
+@pytest.fixture
+def auto_obj(tmp_path):
+    auto_obj = AutoClass(example_options(tmp_path / "output.gcode"))
+    auto_obj.preprocess_image()
+    auto_obj.get_strokes()
+    yield auto_obj
+    auto_obj.cleanup()
+
+# Get the output of every stage that has been run, to check which ones were run again
+def outputs(auto_obj):
+    return {name: auto_obj.stages.values[name] for name in auto_obj.stages.ready()}
+
+# The gcode options are read when the gcode is written, so changing one runs nothing again
+def test_gcode_option_invalidates_nothing(auto_obj):
+    before = outputs(auto_obj)
+    assert auto_obj.update_options({"initial_speed": "2000", "dwell_time": "5"}) == set()
+    strokes = auto_obj.get_strokes()
+    assert all(outputs(auto_obj)[name] is value for name, value in before.items())
+    gcode = "".join(auto_obj.iter_gcode(strokes))
+    assert gcode.startswith("G0 F2000\n") and "G04 P5\n" in gcode
+
+# A new machine size only simplifies the ordered strokes again (ordering works in pixels, solving doesn't care)
+def test_machine_size_reruns_simplify_only(auto_obj):
+    before = outputs(auto_obj)
+    assert auto_obj.update_options({"maximum_x": "900", "border_y": "20"}) == {"strokes"}
+    auto_obj.get_strokes()
+    after = outputs(auto_obj)
+    for name in ("skeleton", "solved", "ordered"):
+        assert after[name] is before[name]
+    assert after["strokes"] is not before["strokes"]
+
+# A new solver throws away the solved pixels and everything after them, but keeps the skeleton
+def test_solver_invalidates_solved(auto_obj):
+    before = outputs(auto_obj)
+    assert auto_obj.update_options({"solver": "trace"}) == {"solved", "ordered", "strokes"}
+    assert len(auto_obj.get_strokes()) > 0
+    assert outputs(auto_obj)["skeleton"] is before["skeleton"]
+
+# Options that change how the image is prepared are refused, and leave everything as it was
+def test_untunable_option_refused(auto_obj):
+    before = outputs(auto_obj)
+    with pytest.raises(PipelineError):
+        auto_obj.update_options({"resolution": "500"})
+    with pytest.raises(PipelineError):
+        auto_obj.update_options({"simplify_tolerance": "abc"})
+    assert outputs(auto_obj) == before
+    assert auto_obj.program_simplify_tolerance == 0.5
+
+# With a fixed pixel size, a new machine size would change the working canvas, so it is refused too
+def test_canvas_change_refused(tmp_path):
+    auto_obj = AutoClass(example_options(tmp_path / "output.gcode", mm_per_pixel=0.5))
+    try:
+        with pytest.raises(PipelineError):
+            auto_obj.update_options({"maximum_x": "900"})
+        assert auto_obj.program_maximum_x == 613
+    finally:
+        auto_obj.cleanup()
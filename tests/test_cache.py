@@ -0,0 +1,49 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import numpy as np
+from python.cache import ResultCache, pack_strokes, unpack_strokes
+
+# Arrays saved under a key load back the same, and strokes survive being packed and unpacked
+def test_round_trip(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    strokes = [np.array([[1, 2], [3, 4]], np.int32), np.array([[5, 6]], np.int32), np.array([[7, 8], [9, 10], [11, 12]], np.int32)]
+    points, lengths = pack_strokes(strokes)
+    skeleton = np.eye(8, dtype=np.uint8) * 255
+    key = cache.key("solved", "image", 1.5)
+    cache.save(key, points=points, lengths=lengths, skeleton=skeleton)
+    arrays = cache.load(key, "points", "lengths")
+    assert set(arrays) == {"points", "lengths", "skeleton"}
+    assert arrays["skeleton"].dtype == np.uint8 and np.array_equal(arrays["skeleton"], skeleton)
+    loaded = unpack_strokes(arrays["points"], arrays["lengths"])
+    assert len(loaded) == len(strokes) and all(np.array_equal(a, b) for a, b in zip(loaded, strokes))
+    assert unpack_strokes(*pack_strokes([])) == []
+
+# A key that was never saved is a miss
+def test_missing_key(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    assert cache.load(cache.key("skeleton", "nothing")) is None
+
+# A truncated or garbled entry is a miss, and is deleted so it gets written again
+def test_corrupt_entry(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    for number, damage in enumerate([lambda data: data[:len(data) // 2], lambda data: b"not a zip file", lambda data: data[:40] + bytes(len(data) - 40)]):
+        key = cache.key("skeleton", number)
+        cache.save(key, skeleton=np.arange(10000, dtype=np.int32))
+        path = os.path.join(str(tmp_path), key + ".npz")
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(damage(data))
+        assert cache.load(key, "skeleton") is None
+        assert not os.path.exists(path)
+
+# An entry without one of the arrays the caller needs is a miss, and is deleted
+def test_entry_missing_array(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    key = cache.key("strokes", "image")
+    cache.save(key, points=np.zeros((3, 2), np.int32), lengths=np.array([3]))
+    assert cache.load(key, "points", "lengths", "stats") is None
+    assert not os.path.exists(os.path.join(str(tmp_path), key + ".npz"))
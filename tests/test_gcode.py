@@ -0,0 +1,64 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import numpy as np
+import pytest
+from python.gcode import iter_gcode, head_gcode
+
+# The program as it was written one point at a time before the moves were formatted in bulk, to check against
+def reference_gcode(points, maximum_x, maximum_y, border_x, border_y, initial_speed, acceleration, dwell_time, debug=False, resolution=(1000, 1000)):
+    header = []
+    if initial_speed != 0:
+        header.append(f"G0 F{initial_speed}\n")
+    if acceleration != 0:
+        header.append(f"M204 X{acceleration} Y{acceleration} Z{acceleration}\n")
+    moves = []
+    strokes = points if len(points) > 0 and np.ndim(points[0]) == 2 else [points]
+    for stroke in strokes:
+        for point in np.asarray(stroke).tolist():
+            printer_x = (((maximum_x-(2*border_x))/resolution[0]) * point[0]) + border_x
+            printer_y = (((maximum_y-(2*border_y))/resolution[1]) * point[1]) + border_y
+            printer_z = 0 if debug else float(printer_y)
+            moves.append(f"G0 X{round(printer_x, 3)} Y{round(printer_y, 3)} Z{round(printer_z, 3)}\n")
+    lines = header + moves
+    # The dwell sits at line 4, or at the end of a shorter program
+    dwell_at = min(3, len(lines))
+    return "".join(lines[:dwell_at] + [f"G04 P{dwell_time}\n"] + lines[dwell_at:])
+
+# Random points on a 1000 x 1000 canvas, as one flat array
+def random_points(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 1000, (count, 2)).astype(np.int32)
+
+# The default program settings
+DEFAULTS = dict(maximum_x=613, maximum_y=548, border_x=50, border_y=50, initial_speed=50000, acceleration=1000, dwell_time=10000)
+
+# The bulk formatting writes exactly the same bytes as formatting each point, with and without debug and header lines
+@pytest.mark.parametrize("debug", [False, True])
+@pytest.mark.parametrize("initial_speed, acceleration", [(50000, 1000), (0, 1000), (50000, 0), (0, 0)])
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 500])
+def test_matches_per_point_formatting(debug, initial_speed, acceleration, count):
+    points = random_points(count)
+    options = dict(DEFAULTS, initial_speed=initial_speed, acceleration=acceleration, debug=debug)
+    assert "".join(iter_gcode(points, **options)) == reference_gcode(points, **options)
+
+# A list of strokes writes the same program as the same points in one flat array, across chunk boundaries too
+@pytest.mark.parametrize("chunk_size", [1, 7, 8192])
+def test_strokes_match_flat_points(chunk_size):
+    points = random_points(300, seed=1)
+    strokes = np.split(points, [2, 3, 50, 51, 200])
+    assert "".join(iter_gcode(strokes, **DEFAULTS, chunk_size=chunk_size)) == reference_gcode(strokes, **DEFAULTS)
+    assert "".join(iter_gcode(strokes, **DEFAULTS, chunk_size=chunk_size)) == "".join(iter_gcode(points, **DEFAULTS))
+
+# Other machine sizes and working resolutions are converted the same way
+@pytest.mark.parametrize("resolution", [(1000, 1000), (640, 480), (1234, 777)])
+def test_matches_with_resolution(resolution):
+    points = random_points(400, seed=2) % np.array(resolution)
+    options = dict(DEFAULTS, maximum_x=300, maximum_y=201, border_x=7, border_y=0)
+    assert "".join(iter_gcode(points, **options, resolution=resolution)) == reference_gcode(points, **options, resolution=resolution)
+
+# The preview is the first lines of the same program
+def test_head_gcode():
+    points = random_points(100, seed=3)
+    program = "".join(iter_gcode(points, **DEFAULTS))
+    assert head_gcode(iter_gcode(points, **DEFAULTS, chunk_size=16), 10) == "".join(program.splitlines(keepends=True)[:10])
@@ -0,0 +1,99 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import numpy as np
+import pytest
+from python.ordering import StrokeTour, nearest_neighbor_tour, order_strokes, travel_length
+
+# Get "count" random strokes of 2 to 5 points each (random walks, so they aren't straight lines)
+def random_strokes(count, seed):
+    rng = np.random.default_rng(seed)
+    strokes = []
+    for _ in range(count):
+        start = rng.integers(0, 1000, 2)
+        steps = rng.integers(-3, 4, (int(rng.integers(1, 5)), 2))
+        strokes.append(np.vstack((start, start + np.cumsum(steps, axis=0))).astype(np.int32))
+    return strokes
+
+# Get a tour over "count" strokes with some of them already flipped
+def sample_tour(count):
+    points = np.arange(count * 2, dtype=np.float64).reshape(count, 2)
+    return StrokeTour(points, points + 0.5, np.arange(count), np.arange(count) % 3 == 0)
+
+# Reversing positions start..end reverses their order and flips each of them, and leaves the rest alone
+def test_reverse_matches_list_reversal():
+    count = 6
+    for start in range(count):
+        for end in range(start, count):
+            tour = sample_tour(count)
+            expected = list(zip(tour.order.tolist(), tour.flipped.tolist()))
+            expected[start:end + 1] = [(index, not flipped) for index, flipped in reversed(expected[start:end + 1])]
+            tour.reverse(start, end)
+            assert list(zip(tour.order.tolist(), tour.flipped.tolist())) == expected
+
+# Moving positions start..end after another position matches removing and re-inserting them in a list
+def test_move_matches_list_relocation():
+    count = 6
+    for start in range(count):
+        for end in range(start, count):
+            for after in list(range(-1, start - 1)) + list(range(end + 1, count)):
+                for reverse in (False, True):
+                    tour = sample_tour(count)
+                    items = list(zip(tour.order.tolist(), tour.flipped.tolist()))
+                    segment = items[start:end + 1]
+                    if reverse:
+                        segment = [(index, not flipped) for index, flipped in reversed(segment)]
+                    # "after" names a position in the tour before the segment was taken out
+                    anchor = items[after] if after >= 0 else None
+                    rest = items[:start] + items[end + 1:]
+                    insert_at = rest.index(anchor) + 1 if anchor is not None else 0
+                    expected = rest[:insert_at] + segment + rest[insert_at:]
+                    tour.move(start, end, after, reverse)
+                    assert list(zip(tour.order.tolist(), tour.flipped.tolist())) == expected
+                    assert np.array_equal(tour.first, np.where(tour.flipped[:, None], tour.ends[tour.order], tour.starts[tour.order]))
+
+# Every stroke comes out exactly once, either as it was or reversed point for point
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_every_stroke_once(seed):
+    strokes = random_strokes(60, seed)
+    ordered, stats = order_strokes(strokes, time_budget=1.0)
+    assert len(ordered) == len(strokes)
+    remaining = {tuple(map(tuple, stroke.tolist())): number for number, stroke in enumerate(strokes)}
+    for stroke in ordered:
+        points = tuple(map(tuple, stroke.tolist()))
+        number = remaining.pop(points, None)
+        if number is None:
+            number = remaining.pop(points[::-1])
+            assert np.array_equal(stroke, strokes[number][::-1])
+    assert not remaining
+
+# The optimized tour is never longer than the nearest-neighbour seed (or the original order, if that was shorter)
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("scale", [(1.0, 1.0), (0.5, 0.3)])
+def test_travel_never_increases(seed, scale):
+    strokes = random_strokes(80, seed)
+    ordered, stats = order_strokes(strokes, scale=scale, time_budget=1.0)
+    assert stats["travel_after"] <= stats["travel_seeded"] + 1e-9
+    assert stats["travel_seeded"] <= stats["travel_before"] + 1e-9
+    assert travel_length(ordered, scale) == pytest.approx(stats["travel_after"])
+
+# Without any time to improve it, the seeded tour is returned as it is
+def test_zero_budget_returns_seed():
+    strokes = random_strokes(40, 3)
+    starts = np.array([stroke[0] for stroke in strokes], dtype=np.float64)
+    ends = np.array([stroke[-1] for stroke in strokes], dtype=np.float64)
+    seed = nearest_neighbor_tour(starts, ends)
+    assert seed.length() < travel_length(strokes)
+    ordered, stats = order_strokes(strokes, time_budget=0)
+    assert stats["passes"] == 0
+    assert stats["travel_after"] == pytest.approx(seed.length())
+    expected = [strokes[index][::-1] if flipped else strokes[index] for index, flipped in zip(seed.order, seed.flipped)]
+    assert all(np.array_equal(a, b) for a, b in zip(ordered, expected))
+
+# Fewer than 2 strokes are returned as they are
+def test_single_stroke():
+    strokes = random_strokes(1, 4)
+    ordered, stats = order_strokes(strokes)
+    assert len(ordered) == 1 and np.array_equal(ordered[0], strokes[0])
+    assert stats["travel_after"] == 0.0
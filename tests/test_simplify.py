@@ -0,0 +1,86 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import math
+import numpy as np
+import pytest
+from python.simplify import merge_collinear, simplify_rdp, simplify_strokes
+
+# Distance from each point to the closest segment of a polyline
+def distance_to_polyline(points, polyline):
+    points = np.asarray(points, dtype=np.float64)
+    polyline = np.asarray(polyline, dtype=np.float64)
+    if len(polyline) == 1:
+        return np.hypot(*(points - polyline[0]).T)
+    starts, ends = polyline[:-1], polyline[1:]
+    direction = ends - starts
+    lengths = np.maximum((direction ** 2).sum(axis=1), 1e-12)
+    along = np.clip(((points[:, None] - starts) * direction).sum(axis=2) / lengths, 0, 1)
+    closest = starts + along[:, :, None] * direction
+    return np.hypot(*(points[:, None] - closest).transpose(2, 0, 1)).min(axis=1)
+
+# Draw a polyline back out one grid step at a time, undoing merge_collinear
+def expand(polyline):
+    points = [tuple(polyline[0])]
+    for (x0, y0), (x1, y1) in zip(polyline[:-1], polyline[1:]):
+        steps = math.gcd(abs(int(x1 - x0)), abs(int(y1 - y0)))
+        for step in range(1, steps + 1):
+            points.append((x0 + (x1 - x0) // steps * step, y0 + (y1 - y0) // steps * step))
+    return points
+
+# A wavy line with a little noise, one pixel per column
+def noisy_curve(seed):
+    rng = np.random.default_rng(seed)
+    x = np.arange(400)
+    y = np.round(40 * np.sin(x / 25) + rng.normal(0, 1.5, len(x)))
+    return np.stack((x, y), axis=1).astype(np.int32)
+
+# Every point RDP drops is within the tolerance of the simplified line, measured in mm after scaling
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("tolerance, scale", [(0.5, (1.0, 1.0)), (2.0, (1.0, 1.0)), (0.5, (0.5, 0.3)), (0.1, (0.513, 0.448))])
+def test_rdp_within_tolerance(seed, tolerance, scale):
+    stroke = noisy_curve(seed)
+    simplified = simplify_rdp(stroke, tolerance, scale)
+    assert len(simplified) < len(stroke)
+    assert np.array_equal(simplified[0], stroke[0]) and np.array_equal(simplified[-1], stroke[-1])
+    scale = np.asarray(scale)
+    assert distance_to_polyline(stroke * scale, simplified * scale).max() <= tolerance + 1e-9
+
+# A closed loop (first point == last point) keeps its shape instead of collapsing onto its start
+@pytest.mark.parametrize("tolerance", [0.5, 2.0])
+def test_rdp_closed_loop(tolerance):
+    angles = np.linspace(0, 2 * math.pi, 200)
+    loop = np.round(np.stack((100 + 50 * np.cos(angles), 100 + 50 * np.sin(angles)), axis=1)).astype(np.int32)
+    assert np.array_equal(loop[0], loop[-1])
+    simplified = simplify_rdp(loop, tolerance)
+    assert np.array_equal(simplified[0], simplified[-1])
+    assert len(simplified) > 4
+    assert distance_to_polyline(loop, simplified).max() <= tolerance + 1e-9
+
+# Merging collinear points of a staircase (and of straight runs) draws exactly the same pixels
+@pytest.mark.parametrize("steps", [
+    [(1, 0), (0, 1)] * 10,
+    [(1, 0), (1, 0), (1, 0), (0, 1)] * 5,
+    [(1, 1)] * 8 + [(1, 0)] * 5 + [(-1, 1)] * 4,
+    [(0, -1)] * 12,
+], ids=["staircase", "long_steps", "diagonals", "straight"])
+def test_merge_collinear_lossless(steps):
+    stroke = np.cumsum([(3, 4)] + steps, axis=0).astype(np.int32)
+    merged = merge_collinear(stroke)
+    assert expand(merged.tolist()) == [tuple(point) for point in stroke.tolist()]
+    assert len(merged) <= len(stroke)
+
+# Only the corners of a straight run are kept, and repeated points are dropped
+def test_merge_collinear_drops_middle_and_repeats():
+    stroke = np.array([(0, 0), (1, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2)], np.int32)
+    assert merge_collinear(stroke).tolist() == [[0, 0], [3, 0], [3, 2]]
+
+# Collinear simplification never drops a drawn pixel, and counts the points before and after
+def test_simplify_strokes_collinear_stats():
+    strokes = [noisy_curve(2), np.array([(0, 0), (1, 0), (2, 0)], np.int32), np.array([(5, 5)], np.int32)]
+    simplified, stats = simplify_strokes(strokes, method="collinear")
+    assert stats["points_before"] == sum(len(stroke) for stroke in strokes)
+    assert stats["points_after"] == sum(len(stroke) for stroke in simplified)
+    for stroke, merged in zip(strokes, simplified):
+        assert distance_to_polyline(stroke, merged).max() == 0
@@ -0,0 +1,59 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import numpy as np
+import pytest
+from python import pipeline
+from python.solver import solve_grid, solve_reference, solve_components, extract_white_pixels
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Get the white pixels of an example image's skeleton
+def example_pixels(name):
+    with open(os.path.join(maindirectory, "examples", f"{name}.png"), "rb") as f:
+        image = pipeline.preprocess_image(f.read(), pipeline.parse_camera_bounds("(0,0)(0,0)"))
+    return extract_white_pixels(pipeline.get_skeleton(image))
+
+# Get "count" distinct random pixels in a "size" x "size" square
+def random_pixels(count, size, seed):
+    rng = np.random.default_rng(seed)
+    cells = rng.choice(size * size, count, replace=False)
+    return np.stack([cells % size, cells // size], axis=1).astype(np.int32)
+
+# The grid solver walks the pixels in exactly the same order as the original all-pairs solver
+@pytest.mark.parametrize("pixels", [
+    np.zeros((0, 2), np.int32),
+    np.array([[5, 7]], np.int32),
+    random_pixels(200, 30, 0),
+    random_pixels(300, 100, 1),
+    example_pixels("webcam_cube"),
+], ids=["empty", "single", "dense", "sparse", "webcam_cube"])
+def test_grid_matches_reference(pixels):
+    grid = solve_grid(pixels)
+    reference = solve_reference(pixels)
+    assert grid.shape == (len(pixels), 2)
+    assert np.array_equal(grid, reference)
+
+# Solving one piece at a time (in one process or several) still visits every pixel exactly once
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("name", ["webcam_cube", "zig_zag"])
+def test_components_visits_every_pixel_once(name, workers):
+    pixels = example_pixels(name)
+    solved = solve_components(pixels, workers=workers)
+    assert len(solved) == len(pixels)
+    assert sorted(map(tuple, solved.tolist())) == sorted(map(tuple, pixels.tolist()))
+
+# An empty skeleton solves to no points
+def test_components_empty():
+    assert len(solve_components(np.zeros((0, 2), np.int32))) == 0
+
+# Enough scattered pixels for solve_components to share the pieces out between worker processes
+def test_components_parallel_visits_every_pixel_once(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    pixels = random_pixels(25000, 400, 2)
+    solved = solve_components(pixels, workers=2)
+    assert len(solved) == len(pixels)
+    assert sorted(map(tuple, solved.tolist())) == sorted(map(tuple, pixels.tolist()))
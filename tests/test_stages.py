@@ -0,0 +1,81 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import pytest
+from python.stages import StageGraph
+
+# A graph of image -> a -> b -> c and image -> d, where b depends on the "width" parameter and d on "speed",
+# with a count of how many times each stage has run
+def counting_graph():
+    runs = {"a": 0, "b": 0, "c": 0, "d": 0}
+    def stage(name, function):
+        def run(*inputs):
+            runs[name] += 1
+            return function(*inputs)
+        return run
+    graph = StageGraph()
+    graph.set("image", 1)
+    graph.add("a", stage("a", lambda image: image + 1), ["image"])
+    graph.add("b", stage("b", lambda a: a * graph.params["width"]), ["a"], ["width"])
+    graph.add("c", stage("c", lambda b: b + 100), ["b"])
+    graph.add("d", stage("d", lambda image: image * graph.params["speed"]), ["image"], ["speed"])
+    graph.set_params({"width": 10, "speed": 3})
+    return graph, runs
+
+# Getting a stage runs it and its inputs once, and getting it again doesn't run anything
+def test_get_memoizes():
+    graph, runs = counting_graph()
+    assert graph.get("c") == 120
+    assert runs == {"a": 1, "b": 1, "c": 1, "d": 0}
+    assert graph.get("c") == 120
+    assert graph.get("b") == 20
+    assert runs == {"a": 1, "b": 1, "c": 1, "d": 0}
+    assert graph.ready() == {"image", "a", "b", "c"}
+
+# Changing a parameter only throws away the stages that use it and the stages computed from them
+def test_set_params_invalidates_downstream_only():
+    graph, runs = counting_graph()
+    graph.get("c")
+    graph.get("d")
+    assert graph.set_params({"width": 20}) == {"b", "c"}
+    assert graph.ready() == {"image", "a", "d"}
+    assert graph.get("c") == 140
+    assert runs == {"a": 1, "b": 2, "c": 2, "d": 1}
+    assert graph.set_params({"speed": 5}) == {"d"}
+    assert graph.get("d") == 5
+
+# Setting a parameter to the value it already has (or one nothing uses) invalidates nothing
+def test_set_params_unchanged():
+    graph, runs = counting_graph()
+    graph.get("c")
+    assert graph.set_params({"width": 10, "speed": 3, "unused": 1}) == set()
+    assert graph.set_params({"unused": 2}) == set()
+    graph.get("c")
+    assert runs["b"] == 1
+
+# A new value for a stage that was set throws away everything computed from it
+def test_set_invalidates_dependents():
+    graph, runs = counting_graph()
+    graph.get("c")
+    graph.get("d")
+    graph.set("image", 2)
+    assert graph.ready() == {"image"}
+    assert graph.get("c") == 130
+    assert runs["a"] == 2
+
+# Adding a stage again keeps its output if nothing changed, and throws it away (and its dependents') if something did
+def test_add_again():
+    graph, runs = counting_graph()
+    function, inputs, params = graph.stages["b"]
+    graph.get("c")
+    graph.add("b", function, inputs, params)
+    assert graph.ready() == {"image", "a", "b", "c"}
+    graph.add("b", function, inputs, ["width", "speed"])
+    assert graph.ready() == {"image", "a"}
+
+# A stage that was never added or set can't be computed
+def test_unknown_stage():
+    graph, runs = counting_graph()
+    with pytest.raises(KeyError):
+        graph.get("missing")
@@ -0,0 +1,37 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import cv2
+import numpy as np
+import pytest
+from python import pipeline
+from python.thinning import HAS_XIMGPROC, thin_lut, thin_ridge
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Get an example image prepared for thinning, the way the pipeline does it
+def prepared_example(name):
+    with open(os.path.join(maindirectory, "examples", f"{name}.png"), "rb") as f:
+        return pipeline.preprocess_image(f.read(), pipeline.parse_camera_bounds("(0,0)(0,0)"))
+
+# The lookup table thinner gives the same skeleton as ximgproc, including on a photo whose resized edges are grey
+@pytest.mark.skipif(not HAS_XIMGPROC, reason="needs opencv-contrib-python")
+@pytest.mark.parametrize("rules", ["zhangsuen", "guohall"])
+@pytest.mark.parametrize("name", ["webcam_cube", "zig_zag"])
+def test_lut_matches_ximgproc(name, rules):
+    image = prepared_example(name)
+    if name == "webcam_cube":
+        assert np.any((image > 0) & (image < 255))
+    thinning_type = cv2.ximgproc.THINNING_ZHANGSUEN if rules == "zhangsuen" else cv2.ximgproc.THINNING_GUOHALL
+    expected = cv2.ximgproc.thinning(image, thinningType=thinning_type)
+    assert np.array_equal(thin_lut(image, rules=rules), expected)
+
+# Grey pixels below 128 are background for every backend, so the ridge skeleton never lands on one
+def test_ridge_ignores_dark_grey():
+    image = prepared_example("webcam_cube")
+    skeleton = thin_ridge(image)
+    assert np.count_nonzero(skeleton) > 0
+    assert not np.any((skeleton > 0) & (image < 128))
@@ -0,0 +1,29 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import numpy as np
+from python import pipeline
+from python.tracer import trace_skeleton
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# A thinned line that steps sideways (rows 2-5, three pixels per step) is one stroke, not one per corner
+def test_staircase_is_one_stroke():
+    skeleton = np.zeros((8, 16), np.uint8)
+    for step in range(4):
+        skeleton[2 + step, 1 + 3 * step:4 + 3 * step] = 255
+    strokes = trace_skeleton(skeleton)
+    assert len(strokes) == 1
+    assert len(strokes[0]) == 12
+
+# The spiral example is a single line, so it traces into a single stroke covering every pixel of its skeleton
+def test_spiral_example_is_one_stroke():
+    with open(os.path.join(maindirectory, "examples", "spiral_pattern.png"), "rb") as f:
+        image = pipeline.preprocess_image(f.read(), pipeline.parse_camera_bounds("(0,0)(0,0)"))
+    skeleton = pipeline.get_skeleton(image)
+    strokes = trace_skeleton(skeleton)
+    assert len(strokes) == 1
+    assert len(strokes[0]) == np.count_nonzero(skeleton)
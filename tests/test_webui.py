@@ -0,0 +1,64 @@
+# MIT License
+# Copyright (c) 2023 Matt Curtis
+
+# Run from the main project directory with `python3 -m pytest tests`
+import os
+import time
+import pytest
+from python.webui import WebUI
+
+# Determine the main project directory, for compatibility (the absolute path to this file, up one dir)
+maindirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# A WebUI test client whose session has stepped through the demo up to the solved skeleton
+@pytest.fixture
+def solved_demo():
+    opts = dict(input="input.png", output="output.gcode", maximum_x=613, maximum_y=548, initial_speed=50000, border_x=50, border_y=50, debug=False, display=False, dwell_time=10000, acceleration=1000, camera_number=0, pi_mode=False, input_pin=0, execute=False, webui=True, camera_bounds="(0,0)(0,0)", travel_time_budget=0.1)
+    webui = WebUI(opts)
+    client = webui.app.test_client()
+    with open(os.path.join(maindirectory, "examples", "zig_zag.png"), "rb") as f:
+        client.post("/demo.html?task=2", data={"file": (f, "zig_zag.png")}, content_type="multipart/form-data")
+    for task in range(3, 14):
+        client.get(f"/demo.html?task={task}")
+    wait_for_job(client)
+    yield webui, client
+    webui.jobs.shutdown()
+
+# Wait for the session's background task to finish
+def wait_for_job(client):
+    with client.session_transaction() as session:
+        job_id = session["job_id"]
+    while client.get(f"/api/jobs/{job_id}").get_json()["status"] not in ("done", "failed", "idle"):
+        time.sleep(0.05)
+
+# Gcode options come back right away without running any stage, and the streamed gcode uses them
+def test_gcode_option(solved_demo):
+    webui, client = solved_demo
+    response = client.post("/api/options", data={"initial_speed": "2000"})
+    assert response.status_code == 200
+    assert response.get_json()["stages"] == []
+    assert client.get(response.get_json()["gcode_url"]).data.startswith(b"G0 F2000\n")
+
+# A new machine size only simplifies again, in the request
+def test_machine_size(solved_demo):
+    webui, client = solved_demo
+    response = client.post("/api/options", data={"maximum_x": "900", "border_x": "20"})
+    assert response.status_code == 200
+    assert response.get_json()["stages"] == ["strokes"]
+
+# A new solver queues the solve again
+def test_solver_queues_solve(solved_demo):
+    webui, client = solved_demo
+    response = client.post("/api/options", data={"solver": "trace"})
+    assert response.status_code == 202
+    assert "solved" in response.get_json()["stages"]
+    wait_for_job(client)
+    assert len(client.get("/gcode/output.gcode").data) > 0
+
+# Options that can't change once the image is prepared, and invalid values, are a bad request
+def test_untunable_option_refused(solved_demo):
+    webui, client = solved_demo
+    response = client.post("/api/options", data={"resolution": "500"})
+    assert response.status_code == 400
+    assert "can't be changed" in response.get_json()["error"]
+    assert client.post("/api/options", data={"simplify_tolerance": "abc"}).status_code == 400